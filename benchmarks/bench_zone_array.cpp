@@ -0,0 +1,109 @@
+/*
+ *  Compares zone sets stored as a std::vector of zones and as a zone_array.
+ *
+ *  Zones are built from random overlapping periods, as in bench_zone_set.py.
+ *  Build and run from the repository root:
+ *
+ *      g++ -O2 -std=c++11 -Iinclude benchmarks/bench_zone_array.cpp -lgmpxx -lgmp -o bench_zone_array
+ *      ./bench_zone_array [--overlap K] 100000 1000000
+ *
+ *  K is the average number of periods overlapping a time point. Cache misses
+ *  can be compared with e.g. perf stat -e cache-misses.
+ */
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <random>
+#include <vector>
+#include <algorithm>
+
+#include "zone_set.hpp"
+#include "zone_array.hpp"
+
+using namespace timedrel;
+
+typedef std::int64_t value_type;
+typedef zone<value_type> zone_type;
+typedef zone_set<value_type> vector_zone_set;
+typedef zone_set<value_type, zone_array<value_type>> array_zone_set;
+
+std::vector<zone_type> random_zones(std::size_t n, std::size_t overlap, unsigned seed){
+    std::mt19937_64 rng(seed);
+    std::uniform_int_distribution<value_type> begin(0, 10 * n), length(1, 10 * overlap);
+
+    std::vector<zone_type> zones;
+    for(std::size_t i = 0; i < n; i++){
+        value_type b = begin(rng);
+        zones.push_back(zone_type::make_from_period(b, b + length(rng)));
+    }
+    return zones;
+}
+
+template <class ZoneSet>
+ZoneSet make(const std::vector<zone_type>& zones){
+    ZoneSet zs;
+    for(const auto& z : zones){
+        zs.add(z);
+    }
+    zs.sort_by_bmin();
+    return zs;
+}
+
+template <class Function>
+double timed(Function f){
+    auto start = std::chrono::steady_clock::now();
+    f();
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+template <class ZoneSet>
+void run(const char* name, const std::vector<zone_type>& zones1, const std::vector<zone_type>& zones2){
+    ZoneSet zs1, zs2;
+    std::size_t n = zones1.size(), size = 0;
+
+    std::printf("%-16s%10zu%12.3f\n", (std::string(name) + " build").c_str(), n,
+                timed([&](){ zs1 = make<ZoneSet>(zones1); zs2 = make<ZoneSet>(zones2); }));
+
+    // Unsorted input, as the sweeps flush their results
+    std::printf("%-16s%10zu%12.3f\n", "sort", n, timed([&](){
+        ZoneSet zs;
+        for(const auto& z : zones1){ zs.push_back(z); }
+        zs.sort_by_bmin();
+        size = zs.size();
+    }));
+
+    std::printf("%-16s%10zu%12.3f\n", "filter", n, timed([&](){ size = ZoneSet::filter(zs1).size(); }));
+    std::printf("%-16s%10zu%12.3f\n", "intersection", n, timed([&](){ size = ZoneSet::intersection(zs1, zs2).size(); }));
+    std::printf("%-16s%10zu%12.3f\n", "concatenation", n, timed([&](){ size = ZoneSet::concatenation(zs1, zs2).size(); }));
+    std::printf("%-16s%10zu%12.3f\n", "union", n, timed([&](){ size = ZoneSet::set_union(zs1, zs2).size(); }));
+    std::printf("%-16s%10zu%12.3f\n", "includes", n, timed([&](){ size = ZoneSet::includes(zs1, zs1); }));
+}
+
+int main(int argc, char** argv){
+    std::size_t overlap = 8;
+    std::vector<std::size_t> sizes;
+
+    for(int i = 1; i < argc; i++){
+        if(std::strcmp(argv[i], "--overlap") == 0 and i + 1 < argc){
+            overlap = std::strtoul(argv[++i], nullptr, 10);
+        } else {
+            sizes.push_back(std::strtoul(argv[i], nullptr, 10));
+        }
+    }
+    if(sizes.empty()){
+        sizes = {10000, 100000};
+    }
+
+    std::printf("bytes per zone: vector %zu, zone_array %zu\n",
+                sizeof(zone_type), 6 * sizeof(value_type) + sizeof(std::uint8_t));
+    std::printf("%-16s%10s%12s\n", "op", "n", "seconds");
+
+    for(auto n : sizes){
+        auto zones1 = random_zones(n, overlap, 1), zones2 = random_zones(n, overlap, 2);
+        run<vector_zone_set>("vector", zones1, zones2);
+        run<array_zone_set>("zone_array", zones1, zones2);
+    }
+    return 0;
+}
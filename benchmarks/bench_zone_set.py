@@ -0,0 +1,59 @@
+"""Scaling benchmark for the zone set operations.
+
+Zones are built from random overlapping periods so that the active lists of
+the sweeps stay populated. Run from the repository root after installing:
+
+    python benchmarks/bench_zone_set.py [--overlap K] 100000 1000000
+
+K is the average number of periods overlapping a time point.
+"""
+import sys
+import time
+
+import numpy as np
+
+from querytre import zoneset
+
+
+def random_zoneset(n, overlap, seed):
+    rng = np.random.default_rng(seed)
+    begins = np.sort(rng.integers(0, 10 * n, n))
+    ends = begins + rng.integers(1, 10 * overlap, n)
+    return zoneset.from_arrays(begins, ends)
+
+
+def timed(op, *args):
+    start = time.perf_counter()
+    result = op(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes, overlap=8):
+    print(f"{'op':<16}{'n':>10}{'zones':>12}{'seconds':>12}")
+    for n in sizes:
+        zs1 = random_zoneset(n, overlap, seed=1)
+        zs2 = random_zoneset(n, overlap, seed=2)
+
+        for name, op in [('intersection', zoneset.intersection),
+                         ('concatenation', zoneset.concatenation),
+                         ('union', zoneset.union)]:
+            seconds, result = timed(op, zs1, zs2)
+            print(f"{name:<16}{n:>10}{len(result.to_numpy()[0]):>12}{seconds:>12.3f}")
+
+        for name, op in [('complementation', zoneset.complementation),
+                         ('closure', zoneset.transitive_closure)]:
+            seconds, result = timed(op, zs1)
+            print(f"{name:<16}{n:>10}{len(result.to_numpy()[0]):>12}{seconds:>12.3f}")
+
+        for name, op in [('difference', zoneset.set_difference)]:
+            seconds, result = timed(op, zs1, zs2)
+            print(f"{name:<16}{n:>10}{len(result.to_numpy()[0]):>12}{seconds:>12.3f}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    overlap = 8
+    if args[:1] == ['--overlap']:
+        overlap = int(args[1])
+        args = args[2:]
+    main([int(arg) for arg in args] or [10 ** 4, 10 ** 5], overlap)
@@ -90,6 +90,14 @@ struct lower_bound : bound<T>{
     
     lower_bound(T v, bool p) : bound<T>(v, p){}
 
+    /*
+     *  Whether the value x satisfies the bound, e.g. (x >= 3) admits 3
+     */
+    bool admits(const T& x) const {
+        return (this->value < x) ||
+               (this->value == x and this->sign);
+    }
+
     /* 
      *  Non-strict inclusion order 
      *  e.g. (x >= 3) includes (x > 4)
@@ -161,6 +169,14 @@ struct upper_bound : public bound<T> {
     typedef upper_bound<T> upper_bound_type;
 
     upper_bound(T v, bool p) : bound<T>(v, p){}
+
+    /*
+     *  Whether the value x satisfies the bound, e.g. (x < 3) does not admit 3
+     */
+    bool admits(const T& x) const {
+        return (x < this->value) ||
+               (x == this->value and this->sign);
+    }
     
     /* 
      *  Sorting order
@@ -0,0 +1,553 @@
+#include <map>
+#include <array>
+#include <queue>
+#include <vector>
+#include <cstdint>
+#include <type_traits>
+#include <utility>
+#include <algorithm>
+#include <functional>
+
+#include "zone.hpp"
+
+#ifndef TIMEDREL_SWEEP_HPP
+#define TIMEDREL_SWEEP_HPP
+
+namespace timedrel {
+
+/*
+ *  64-bit integer comparisons do not vectorize with the SSE2 baseline of x86-64,
+ *  so the batched tests are also compiled for SSE4.2 and AVX2, the version for
+ *  the CPU being selected when the module is loaded.
+ */
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__) && defined(__linux__)
+#define TIMEDREL_TARGET_CLONES __attribute__((target_clones("avx2", "sse4.2", "default")))
+#else
+#define TIMEDREL_TARGET_CLONES
+#endif
+
+/*
+ *  Zones stored by columns for batched tests of one zone against all of them.
+ *
+ *  Each bound is a column of values and a column of signs, and removed zones
+ *  are masked by a column of flags. The tests are branch-free loops over the
+ *  columns, which the compiler vectorizes for integral and floating point values,
+ *  run in blocks so that a match stops the scan early. The first zones are tested
+ *  one by one, which is enough for the few active zones of most sweeps.
+ */
+template <class T>
+class zone_block {
+public:
+    typedef zone<T>                              zone_type;
+    typedef typename zone_type::lower_bound_type lower_bound_type;
+    typedef typename zone_type::upper_bound_type upper_bound_type;
+
+private:
+    // Flags as wide as arithmetic values, so that they fill the same vector lanes
+    typedef typename std::conditional<std::is_arithmetic<T>::value and sizeof(T) == 8,
+        std::uint64_t, std::uint8_t>::type flag_type;
+
+    static const std::size_t block_size = 64;
+    static const std::size_t scan_size = 16;
+
+    std::array<std::vector<T>, 6> values;
+    std::array<std::vector<flag_type>, 6> signs;
+    std::vector<flag_type> alive;
+    std::size_t num_alive;
+
+    /*
+     *  Whether the k-th bounds of the zones include the bound (v, s), e.g. the
+     *  lower bounds (x >= 3) and (x > 3) include (x > 3).
+     */
+    template <bool Lower>
+    static flag_type includes(const T& v1, flag_type s1, const T& v, flag_type s){
+        return flag_type(Lower ? v1 < v : v < v1) | (flag_type(v1 == v) & flag_type(s1 >= s));
+    }
+
+    /*
+     *  Whether the bound (v1, s1) admits x.
+     */
+    template <bool Lower>
+    static flag_type admits(const T& v1, flag_type s1, const T& x){
+        return flag_type(Lower ? v1 < x : x < v1) | (flag_type(v1 == x) & s1);
+    }
+
+public:
+    zone_block() : num_alive(0) {}
+
+    std::size_t size() const {
+        return alive.size();
+    }
+
+    bool empty() const {
+        return num_alive == 0;
+    }
+
+    bool is_alive(std::size_t i) const {
+        return alive[i];
+    }
+
+    zone_type get(std::size_t i) const {
+        return zone_type::from_bounds(
+            lower_bound_type(values[0][i], signs[0][i]), upper_bound_type(values[1][i], signs[1][i]),
+            lower_bound_type(values[2][i], signs[2][i]), upper_bound_type(values[3][i], signs[3][i]),
+            lower_bound_type(values[4][i], signs[4][i]), upper_bound_type(values[5][i], signs[5][i]));
+    }
+
+    void push_back(const zone_type& z){
+        const auto* bounds = z.bounds();
+        for(std::size_t k = 0; k < 6; k++){
+            values[k].push_back(bounds[k].value);
+            signs[k].push_back(bounds[k].sign);
+        }
+        alive.push_back(1);
+        num_alive++;
+    }
+
+    /*
+     *  Replaces the i-th zone, e.g. in a slot freed by remove.
+     */
+    void set(std::size_t i, const zone_type& z){
+        const auto* bounds = z.bounds();
+        for(std::size_t k = 0; k < 6; k++){
+            values[k][i] = bounds[k].value;
+            signs[k][i] = bounds[k].sign;
+        }
+        num_alive += not alive[i];
+        alive[i] = 1;
+    }
+
+    void remove(std::size_t i){
+        num_alive -= alive[i];
+        alive[i] = 0;
+    }
+
+    void clear(){
+        for(std::size_t k = 0; k < 6; k++){
+            values[k].clear();
+            signs[k].clear();
+        }
+        alive.clear();
+        num_alive = 0;
+    }
+
+    std::size_t count() const {
+        return num_alive;
+    }
+
+    /*
+     *  Drops the removed zones, which moves the others to the front.
+     */
+    void compact(){
+        std::size_t j = 0;
+        for(std::size_t i = 0; i < alive.size(); i++){
+            if(alive[i]){
+                for(std::size_t k = 0; k < 6; k++){
+                    values[k][j] = values[k][i];
+                    signs[k][j] = signs[k][i];
+                }
+                j++;
+            }
+        }
+        for(std::size_t k = 0; k < 6; k++){
+            values[k].resize(j);
+            signs[k].resize(j);
+        }
+        alive.assign(j, 1);
+    }
+
+    /*
+     *  Removes the zones whose bmax is strictly before the bound b.
+     */
+    TIMEDREL_TARGET_CLONES
+    void expire(const lower_bound_type& b){
+        const T* bmax = values[1].data();
+        const flag_type* sign = signs[1].data();
+        flag_type* live = alive.data();
+        const std::size_t n = alive.size();
+        std::size_t removed = 0;
+
+        for(std::size_t i = 0; i < n; i++){
+            // bmax < b, in the order of upper_bound_type::operator<
+            const flag_type before = flag_type(bmax[i] < b.value) |
+                                     (flag_type(bmax[i] == b.value) & flag_type(sign[i] < flag_type(b.sign)));
+            removed += live[i] & before;
+            live[i] &= flag_type(not before);
+        }
+        num_alive -= removed;
+    }
+
+    /*
+     *  Whether a zone of the block includes z.
+     */
+    bool any_includes(const zone_type& z) const {
+        const std::size_t n = std::min(alive.size(), scan_size);
+        for(std::size_t i = 0; i < n; i++){
+            if(alive[i] and zone_type::includes(get(i), z)){
+                return true;
+            }
+        }
+        return n < alive.size() and batch_includes(z, n);
+    }
+
+    /*
+     *  Whether a zone of the block contains the period from b to e.
+     */
+    bool any_contains(const T& b, const T& e) const {
+        const std::size_t n = std::min(alive.size(), scan_size);
+        for(std::size_t i = 0; i < n; i++){
+            if(alive[i] and get(i).contains(b, e)){
+                return true;
+            }
+        }
+        return n < alive.size() and batch_contains(b, e, n);
+    }
+
+private:
+    TIMEDREL_TARGET_CLONES
+    bool batch_includes(const zone_type& z, std::size_t start) const {
+        const auto* bounds = z.bounds();
+        const T v0 = bounds[0].value, v1 = bounds[1].value, v2 = bounds[2].value,
+                v3 = bounds[3].value, v4 = bounds[4].value, v5 = bounds[5].value;
+        const flag_type s0 = bounds[0].sign, s1 = bounds[1].sign, s2 = bounds[2].sign,
+                        s3 = bounds[3].sign, s4 = bounds[4].sign, s5 = bounds[5].sign;
+
+        for(std::size_t first = start; first < alive.size(); first += block_size){
+            const std::size_t last = std::min(alive.size(), first + block_size);
+            flag_type found = 0;
+            for(std::size_t i = first; i < last; i++){
+                found |= alive[i] &
+                         includes<true>(values[0][i], signs[0][i], v0, s0) &
+                         includes<false>(values[1][i], signs[1][i], v1, s1) &
+                         includes<true>(values[2][i], signs[2][i], v2, s2) &
+                         includes<false>(values[3][i], signs[3][i], v3, s3) &
+                         includes<true>(values[4][i], signs[4][i], v4, s4) &
+                         includes<false>(values[5][i], signs[5][i], v5, s5);
+            }
+            if(found){
+                return true;
+            }
+        }
+        return false;
+    }
+
+    TIMEDREL_TARGET_CLONES
+    bool batch_contains(const T& b, const T& e, std::size_t start) const {
+        const T d = e - b;
+
+        for(std::size_t first = start; first < alive.size(); first += block_size){
+            const std::size_t last = std::min(alive.size(), first + block_size);
+            flag_type found = 0;
+            for(std::size_t i = first; i < last; i++){
+                found |= alive[i] &
+                         admits<true>(values[0][i], signs[0][i], b) &
+                         admits<false>(values[1][i], signs[1][i], b) &
+                         admits<true>(values[2][i], signs[2][i], e) &
+                         admits<false>(values[3][i], signs[3][i], e) &
+                         admits<true>(values[4][i], signs[4][i], d) &
+                         admits<false>(values[5][i], signs[5][i], d);
+            }
+            if(found){
+                return true;
+            }
+        }
+        return false;
+    }
+};
+
+/*
+ *  Active zones of a plane sweep.
+ *
+ *  Zones are visited in insertion order. A zone expires once its key bound
+ *  (e.g. bmax) falls strictly before the sweep line. Expired zones are found
+ *  through a min-heap on the key, so that each zone is removed in O(log n)
+ *  instead of rescanning the whole list at every step of the sweep.
+ */
+template <class T>
+class sweep_list {
+public:
+    typedef zone<T>                              zone_type;
+    typedef typename zone_type::lower_bound_type lower_bound_type;
+    typedef typename zone_type::upper_bound_type upper_bound_type;
+    typedef upper_bound_type (zone_type::*key_type)() const;
+
+private:
+    typedef std::pair<upper_bound_type, std::size_t> entry_type;
+
+    struct later_key {
+        bool operator() (const entry_type& e1, const entry_type& e2) const {
+            return e2.first < e1.first;
+        }
+    };
+
+    typedef std::priority_queue<entry_type, std::vector<entry_type>, later_key> heap_type;
+
+    key_type key;
+    std::vector<zone_type> zones;
+    std::vector<bool> alive;
+    std::size_t num_alive;
+    heap_type heap;
+
+    // Columns of the first synced zones, built by the first batched test
+    mutable zone_block<T> block;
+    mutable std::size_t synced;
+
+    void sync() const {
+        for(; synced < zones.size(); synced++){
+            block.push_back(zones[synced]);
+            if(not alive[synced]){
+                block.remove(synced);
+            }
+        }
+    }
+
+    /*
+     *  Drops expired zones from storage once they outnumber the active ones.
+     */
+    void compact(){
+        std::vector<zone_type> active_zones;
+        std::vector<entry_type> entries;
+
+        active_zones.reserve(num_alive);
+        entries.reserve(num_alive);
+
+        for(std::size_t i = 0; i < zones.size(); i++){
+            if(alive[i]){
+                entries.push_back(entry_type((zones[i].*key)(), active_zones.size()));
+                active_zones.push_back(zones[i]);
+            }
+        }
+
+        zones.swap(active_zones);
+        alive.assign(zones.size(), true);
+        heap = heap_type(later_key(), std::move(entries));
+
+        block.clear();
+        synced = 0;
+    }
+
+public:
+    explicit sweep_list(key_type k) : key(k), num_alive(0), synced(0) {}
+
+    bool empty() const {
+        return num_alive == 0;
+    }
+
+    void push_back(const zone_type& z){
+        heap.push(entry_type((z.*key)(), zones.size()));
+        zones.push_back(z);
+        alive.push_back(true);
+        num_alive++;
+    }
+
+    /*
+     *  Removes the zones whose key is strictly before the bound b.
+     */
+    void expire(const lower_bound_type& b){
+        while(not heap.empty() and heap.top().first < b){
+            const std::size_t i = heap.top().second;
+            alive[i] = false;
+            if(i < synced){
+                block.remove(i);
+            }
+            heap.pop();
+            num_alive--;
+        }
+        if(2 * num_alive < zones.size()){
+            compact();
+        }
+    }
+
+    template <class Function>
+    void for_each(Function f) const {
+        for(std::size_t i = 0; i < zones.size(); i++){
+            if(alive[i]){
+                f(zones[i]);
+            }
+        }
+    }
+
+    template <class Predicate>
+    bool any_of(Predicate p) const {
+        for(std::size_t i = 0; i < zones.size(); i++){
+            if(alive[i] and p(zones[i])){
+                return true;
+            }
+        }
+        return false;
+    }
+
+    /*
+     *  Whether an active zone includes z, see zone_block.
+     */
+    bool any_includes(const zone_type& z) const {
+        sync();
+        return block.any_includes(z);
+    }
+
+    /*
+     *  Whether an active zone contains the period from b to e, see zone_block.
+     */
+    bool any_contains(const T& b, const T& e) const {
+        sync();
+        return block.any_contains(b, e);
+    }
+};
+
+/*
+ *  Zones produced by a plane sweep, none of which includes another.
+ *
+ *  Zones are indexed by bmin in the inclusion order of lower bounds. A zone z
+ *  can only be included in zones before the position of z.bmin, and can only
+ *  include zones after it, so each subsumption test scans one side of the
+ *  index. For input sorted by bmin the second side holds the zones with the
+ *  same bmin only. A min-heap on bmax finds the zones to flush.
+ */
+template <class T>
+class maximal_zones {
+public:
+    typedef zone<T>                              zone_type;
+    typedef typename zone_type::lower_bound_type lower_bound_type;
+    typedef typename zone_type::upper_bound_type upper_bound_type;
+
+private:
+    typedef std::multimap<lower_bound_type, std::size_t> index_type;
+
+    struct slot_type {
+        zone_type zone;
+        typename index_type::iterator position;
+        std::size_t generation;
+
+        slot_type(const zone_type& z, typename index_type::iterator pos)
+            : zone(z), position(pos), generation(0) {}
+    };
+
+    struct entry_type {
+        upper_bound_type key;
+        std::size_t slot;
+        std::size_t generation;
+
+        entry_type(const upper_bound_type& k, std::size_t s, std::size_t g)
+            : key(k), slot(s), generation(g) {}
+    };
+
+    struct later_key {
+        bool operator() (const entry_type& e1, const entry_type& e2) const {
+            return e2.key < e1.key;
+        }
+    };
+
+    typedef std::priority_queue<entry_type, std::vector<entry_type>, later_key> heap_type;
+
+    std::vector<slot_type> slots;
+    std::vector<std::size_t> free_slots;
+    index_type index;
+    heap_type heap;
+
+    void remove(std::size_t i){
+        index.erase(slots[i].position);
+        slots[i].generation++;
+        free_slots.push_back(i);
+    }
+
+    std::size_t insert(const zone_type& z){
+        auto pos = index.insert(std::make_pair(z.get_bmin(), std::size_t(0)));
+        std::size_t i;
+
+        if(free_slots.empty()){
+            i = slots.size();
+            slots.push_back(slot_type(z, pos));
+        } else {
+            i = free_slots.back();
+            free_slots.pop_back();
+            slots[i].zone = z;
+            slots[i].position = pos;
+        }
+        pos->second = i;
+        heap.push(entry_type(z.get_bmax(), i, slots[i].generation));
+
+        return i;
+    }
+
+    /*
+     *  Rebuilds the heap once stale entries of removed zones dominate it.
+     */
+    void compact(){
+        if(heap.size() <= 2 * index.size() + 16){
+            return;
+        }
+        std::vector<entry_type> entries;
+        entries.reserve(index.size());
+        for(const auto& entry : index){
+            const slot_type& slot = slots[entry.second];
+            entries.push_back(entry_type(slot.zone.get_bmax(), entry.second, slot.generation));
+        }
+        heap = heap_type(later_key(), std::move(entries));
+    }
+
+public:
+    bool empty() const {
+        return index.empty();
+    }
+
+    /*
+     *  Adds z unless an active zone includes it, removing the active zones z
+     *  includes. Then moves the zones whose bmax is strictly before the bound b
+     *  to the output.
+     */
+    template <class Output>
+    void add(const zone_type& z, const lower_bound_type& b, Output& output){
+
+        if(not z.is_nonempty()){
+            return;
+        }
+
+        // Zones with bmin including z.bmin
+        auto last = index.upper_bound(z.get_bmin());
+        for(auto it = index.begin(); it != last; it++){
+            if(zone_type::includes(slots[it->second].zone, z)){
+                return;
+            }
+        }
+
+        // Zones with bmin included in z.bmin
+        for(auto it = index.lower_bound(z.get_bmin()); it != index.end(); ){
+            std::size_t i = it->second;
+            it++;
+            if(zone_type::includes(z, slots[i].zone)){
+                remove(i);
+            }
+        }
+
+        insert(z);
+
+        while(not heap.empty() and heap.top().key < b){
+            const entry_type& top = heap.top();
+            if(slots[top.slot].generation == top.generation){
+                output.push_back(slots[top.slot].zone);
+                remove(top.slot);
+            }
+            heap.pop();
+        }
+
+        compact();
+    }
+
+    /*
+     *  Moves all the active zones to the output, ordered by bmin.
+     */
+    template <class Output>
+    void flush(Output& output){
+        for(const auto& entry : index){
+            output.push_back(slots[entry.second].zone);
+        }
+        index.clear();
+        slots.clear();
+        free_slots.clear();
+        heap = heap_type();
+    }
+};
+
+} // namespace timedrel
+
+#endif // TIMEDREL_SWEEP_HPP
@@ -30,8 +30,16 @@ public:
 
 private:
 
-    lower_bound_type bmin, emin, dmin;
-    upper_bound_type bmax, emax, dmax;
+    /*
+     *  Bounds are laid out contiguously in the order bmin, bmax, emin, emax, dmin, dmax.
+     *  See `bounds()`.
+     */
+    lower_bound_type bmin;
+    upper_bound_type bmax;
+    lower_bound_type emin;
+    upper_bound_type emax;
+    lower_bound_type dmin;
+    upper_bound_type dmax;
 
     // zone(const zone&) = default;
     
@@ -108,6 +116,14 @@ public:
         );
     }
 
+    /*
+     *  Constructs a zone with the bounds as given, e.g. the normalized bounds of a
+     *  stored zone. See `zone_array`.
+     */
+    static zone_type from_bounds(const lower_bound_type& bmin, const upper_bound_type& bmax,const lower_bound_type& emin,const upper_bound_type& emax, const lower_bound_type& dmin, const upper_bound_type& dmax){
+        return zone_type(bmin, bmax, emin, emax, dmin, dmax);
+    }
+
     static zone_type make_from(const std::array<T, 6>& values, const std::array<bool, 6>& signs){
         return make(values, signs);
     }
@@ -185,6 +201,21 @@ public:
     inline lower_bound_type get_dmin() const {return dmin;}
     inline upper_bound_type get_dmax() const {return dmax;}
 
+    /*
+     *  Pointer to the six bounds of the zone, stored as an array of bound_type.
+     */
+    inline const bound_type* bounds() const {return &bmin;}
+
+    /*
+     *  Whether the zone contains the period from b to e, i.e. the point (b, e, e - b).
+     */
+    bool contains(const value_type& b, const value_type& e) const {
+        const value_type d = e - b;
+        return bmin.admits(b) and bmax.admits(b) and
+               emin.admits(e) and emax.admits(e) and
+               dmin.admits(d) and dmax.admits(d);
+    }
+
     static bool includes(
         const zone_type& z1, 
         const zone_type& z2){
@@ -199,6 +230,14 @@ public:
 
     static zone_type concatenation(const zone_type& z1, const zone_type& z2){
 
+        // Meeting points of z1 and z2, i.e. the ends of z1 that are also begins of z2
+        auto mmin = lower_bound_type::intersection(z1.get_emin(), z2.get_bmin());
+        auto mmax = upper_bound_type::intersection(z1.get_emax(), z2.get_bmax());
+
+        if(not bound_type::is_valid_interval(mmin, mmax)){
+            return zone_type(mmin, mmax, mmin, mmax, z1.get_dmin(), z1.get_dmax()); // empty
+        }
+
         return make(
 
             lower_bound_type::intersection(
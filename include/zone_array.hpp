@@ -0,0 +1,311 @@
+#include <array>
+#include <vector>
+#include <cstdint>
+#include <cstddef>
+#include <iterator>
+#include <utility>
+
+#include "zone.hpp"
+
+#ifndef TIMEDREL_ZONE_ARRAY_HPP
+#define TIMEDREL_ZONE_ARRAY_HPP
+
+namespace timedrel {
+
+/*
+ *  Sequence of zones stored as a structure of arrays.
+ *
+ *  The values of the six bounds (bmin, bmax, emin, emax, dmin, dmax) are kept in
+ *  six arrays and their signs in one 6-bit mask per zone, i.e. 6 * sizeof(T) + 1
+ *  bytes per zone instead of the padded sizeof(zone<T>) of a std::vector. It
+ *  models the sequence operations zone_set needs from its Container, e.g.
+ *
+ *      zone_set<int64_t, zone_array<int64_t>> zs;
+ *
+ *  Elements are read as zone<T> values. Mutable iterators dereference to a proxy
+ *  that converts to and is assignable from zone<T>, so that std::sort and the
+ *  other algorithms of zone_set apply.
+ */
+template <class T>
+class zone_array {
+public:
+    typedef zone<T>                              value_type;
+    typedef zone<T>                              zone_type;
+    typedef typename zone_type::lower_bound_type lower_bound_type;
+    typedef typename zone_type::upper_bound_type upper_bound_type;
+
+    typedef std::size_t                          size_type;
+    typedef std::ptrdiff_t                       difference_type;
+
+private:
+    std::array<std::vector<T>, 6> values;
+    std::vector<std::uint8_t> signs;
+
+    /*
+     *  Reference to the i-th zone of an array. Reads the bounds in place, so that
+     *  e.g. it->get_bmin() loads one value and one sign, and converts to a zone.
+     */
+    template <class Array>
+    class basic_reference {
+
+    friend class zone_array;
+
+    protected:
+        Array* array;
+        size_type i;
+
+        basic_reference(Array* a, size_type j) : array(a), i(j) {}
+
+    public:
+        operator zone_type() const { return array->get(i); }
+
+        lower_bound_type get_bmin() const { return array->lower(0, i); }
+        upper_bound_type get_bmax() const { return array->upper(1, i); }
+        lower_bound_type get_emin() const { return array->lower(2, i); }
+        upper_bound_type get_emax() const { return array->upper(3, i); }
+        lower_bound_type get_dmin() const { return array->lower(4, i); }
+        upper_bound_type get_dmax() const { return array->upper(5, i); }
+    };
+
+    /*
+     *  Holds a reference for the operator-> of iterators.
+     */
+    template <class Reference>
+    struct arrow {
+        Reference r;
+        const Reference* operator->() const { return &r; }
+    };
+
+public:
+    class reference;
+    typedef basic_reference<const zone_array>    const_reference;
+
+private:
+
+    template <class Array, class Reference>
+    class basic_iterator {
+
+    friend class zone_array;
+
+        Array* array;
+        size_type i;
+
+    public:
+        typedef std::random_access_iterator_tag iterator_category;
+        typedef zone_type                       value_type;
+        typedef std::ptrdiff_t                  difference_type;
+        typedef Reference                       reference;
+        typedef arrow<Reference>                pointer;
+
+        basic_iterator() : array(nullptr), i(0) {}
+        basic_iterator(Array* a, size_type j) : array(a), i(j) {}
+
+        // Mutable iterators convert to constant ones
+        template <class Array1, class Reference1>
+        basic_iterator(const basic_iterator<Array1, Reference1>& other) : array(other.array), i(other.i) {}
+
+        reference operator*() const { return array->at(i); }
+        pointer operator->() const { return pointer{array->at(i)}; }
+        reference operator[](difference_type n) const { return array->at(i + n); }
+
+        basic_iterator& operator++() { i++; return *this; }
+        basic_iterator& operator--() { i--; return *this; }
+        basic_iterator operator++(int) { basic_iterator it = *this; i++; return it; }
+        basic_iterator operator--(int) { basic_iterator it = *this; i--; return it; }
+
+        basic_iterator& operator+=(difference_type n) { i += n; return *this; }
+        basic_iterator& operator-=(difference_type n) { i -= n; return *this; }
+        basic_iterator operator+(difference_type n) const { return basic_iterator(array, i + n); }
+        basic_iterator operator-(difference_type n) const { return basic_iterator(array, i - n); }
+        friend basic_iterator operator+(difference_type n, const basic_iterator& it) { return it + n; }
+
+        template <class Array1, class Reference1>
+        difference_type operator-(const basic_iterator<Array1, Reference1>& other) const {
+            return difference_type(i) - difference_type(other.i);
+        }
+
+        template <class Array1, class Reference1>
+        bool operator==(const basic_iterator<Array1, Reference1>& other) const { return i == other.i; }
+        template <class Array1, class Reference1>
+        bool operator!=(const basic_iterator<Array1, Reference1>& other) const { return i != other.i; }
+        template <class Array1, class Reference1>
+        bool operator<(const basic_iterator<Array1, Reference1>& other) const { return i < other.i; }
+        template <class Array1, class Reference1>
+        bool operator>(const basic_iterator<Array1, Reference1>& other) const { return i > other.i; }
+        template <class Array1, class Reference1>
+        bool operator<=(const basic_iterator<Array1, Reference1>& other) const { return i <= other.i; }
+        template <class Array1, class Reference1>
+        bool operator>=(const basic_iterator<Array1, Reference1>& other) const { return i >= other.i; }
+
+        template <class Array1, class Reference1>
+        friend class basic_iterator;
+    };
+
+public:
+    typedef basic_iterator<zone_array, reference>                   iterator;
+    typedef basic_iterator<const zone_array, const_reference>       const_iterator;
+    typedef iterator                                                pointer;
+    typedef const_iterator                                          const_pointer;
+
+    /*
+     *  Mutable reference to the i-th zone of an array, writing a zone on assignment.
+     */
+    class reference : public basic_reference<zone_array> {
+
+    friend class zone_array;
+
+        using basic_reference<zone_array>::array;
+        using basic_reference<zone_array>::i;
+
+        reference(zone_array* a, size_type j) : basic_reference<zone_array>(a, j) {}
+
+    public:
+        reference(const reference& other) = default;
+
+        reference& operator=(const zone_type& z){
+            array->set(i, z);
+            return *this;
+        }
+
+        // Assigns the referred zone, not the reference
+        reference& operator=(const reference& other){
+            array->set(i, other.array->get(other.i));
+            return *this;
+        }
+
+        friend void swap(reference r1, reference r2){
+            r1.swap(r2);
+        }
+
+    private:
+        void swap(const reference& other) const {
+            array->swap_zones(i, other.i);
+        }
+    };
+
+private:
+    lower_bound_type lower(std::size_t k, size_type i) const {
+        return lower_bound_type(values[k][i], (signs[i] >> k) & 1);
+    }
+
+    upper_bound_type upper(std::size_t k, size_type i) const {
+        return upper_bound_type(values[k][i], (signs[i] >> k) & 1);
+    }
+
+    zone_type get(size_type i) const {
+        return zone_type::from_bounds(lower(0, i), upper(1, i), lower(2, i), upper(3, i), lower(4, i), upper(5, i));
+    }
+
+    void set(size_type i, const zone_type& z){
+        const auto* bounds = z.bounds();
+        std::uint8_t mask = 0;
+        for(std::size_t k = 0; k < 6; k++){
+            values[k][i] = bounds[k].value;
+            mask |= std::uint8_t(bounds[k].sign) << k;
+        }
+        signs[i] = mask;
+    }
+
+    void swap_zones(size_type i, size_type j){
+        for(std::size_t k = 0; k < 6; k++){
+            std::swap(values[k][i], values[k][j]);
+        }
+        std::swap(signs[i], signs[j]);
+    }
+
+    reference at(size_type i){
+        return reference(this, i);
+    }
+
+    const_reference at(size_type i) const {
+        return const_reference(this, i);
+    }
+
+public:
+    bool empty() const {
+        return signs.empty();
+    }
+    size_type size() const {
+        return signs.size();
+    }
+
+    void reserve(size_type n){
+        for(auto& column : values){
+            column.reserve(n);
+        }
+        signs.reserve(n);
+    }
+
+    iterator begin(){ return iterator(this, 0); }
+    iterator end(){ return iterator(this, size()); }
+    const_iterator begin() const { return const_iterator(this, 0); }
+    const_iterator end() const { return const_iterator(this, size()); }
+    const_iterator cbegin() const { return begin(); }
+    const_iterator cend() const { return end(); }
+
+    reference operator[](size_type i){ return at(i); }
+    const_reference operator[](size_type i) const { return at(i); }
+
+    reference front(){ return at(0); }
+    const_reference front() const { return at(0); }
+    reference back(){ return at(size() - 1); }
+    const_reference back() const { return at(size() - 1); }
+
+    void push_back(const zone_type& z){
+        for(auto& column : values){
+            column.push_back(T());
+        }
+        signs.push_back(0);
+        set(size() - 1, z);
+    }
+
+    void clear(){
+        for(auto& column : values){
+            column.clear();
+        }
+        signs.clear();
+    }
+
+    iterator insert(const_iterator pos, const zone_type& z){
+        const size_type i = pos.i;
+        for(auto& column : values){
+            column.insert(column.begin() + i, T());
+        }
+        signs.insert(signs.begin() + i, 0);
+        set(i, z);
+        return iterator(this, i);
+    }
+
+    template <class InputIt>
+    iterator insert(const_iterator pos, InputIt first, InputIt last){
+        size_type i = pos.i;
+        for(; first != last; first++, i++){
+            insert(const_iterator(this, i), zone_type(*first));
+        }
+        return iterator(this, pos.i);
+    }
+
+    iterator erase(const_iterator first, const_iterator last){
+        for(auto& column : values){
+            column.erase(column.begin() + first.i, column.begin() + last.i);
+        }
+        signs.erase(signs.begin() + first.i, signs.begin() + last.i);
+        return iterator(this, first.i);
+    }
+
+    iterator erase(const_iterator pos){
+        return erase(pos, pos + 1);
+    }
+
+    bool operator==(const zone_array& other) const {
+        return values == other.values and signs == other.signs;
+    }
+
+    bool operator!=(const zone_array& other) const {
+        return not (*this == other);
+    }
+};
+
+} // namespace timedrel
+
+#endif // TIMEDREL_ZONE_ARRAY_HPP
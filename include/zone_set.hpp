@@ -4,14 +4,17 @@
 #include <vector>
 #include <deque>
 #include <algorithm>
+#include <numeric>
 #include <sstream>
 #include <iostream>
  
 #include <string>
 #include <gmpxx.h>
 #include <type_traits>
+#include <stdexcept>
 
 #include "zone.hpp"
+#include "sweep.hpp"
 
 namespace timedrel {
 
@@ -72,6 +75,84 @@ struct earlier_emin {
     }
 };
 
+/*
+ *  Loosest bounds of the zones of a zone set on begins, ends and durations.
+ *
+ *  Every period of a zone of the set lies within these bounds, so that zone sets
+ *  whose summaries do not overlap have no period in common. The summary of the
+ *  empty set admits no period.
+ */
+template <class T>
+struct zone_set_summary {
+
+    typedef T                                    value_type;
+    typedef zone<T>                              zone_type;
+    typedef typename zone_type::lower_bound_type lower_bound_type;
+    typedef typename zone_type::upper_bound_type upper_bound_type;
+
+    lower_bound_type bmin;
+    upper_bound_type bmax;
+    lower_bound_type emin;
+    upper_bound_type emax;
+    lower_bound_type dmin;
+    upper_bound_type dmax;
+
+    zone_set_summary() :
+        bmin(lower_bound_type::open(bound<T>::infinity())), bmax(upper_bound_type::open(-bound<T>::infinity())),
+        emin(lower_bound_type::open(bound<T>::infinity())), emax(upper_bound_type::open(-bound<T>::infinity())),
+        dmin(lower_bound_type::open(bound<T>::infinity())), dmax(upper_bound_type::open(-bound<T>::infinity())) {}
+
+    inline lower_bound_type get_bmin() const {return bmin;}
+    inline upper_bound_type get_bmax() const {return bmax;}
+    inline lower_bound_type get_emin() const {return emin;}
+    inline upper_bound_type get_emax() const {return emax;}
+    inline lower_bound_type get_dmin() const {return dmin;}
+    inline upper_bound_type get_dmax() const {return dmax;}
+
+    void add(const zone_type& z){
+        bmin = loosest(bmin, z.get_bmin());
+        bmax = loosest(bmax, z.get_bmax());
+        emin = loosest(emin, z.get_emin());
+        emax = loosest(emax, z.get_emax());
+        dmin = loosest(dmin, z.get_dmin());
+        dmax = loosest(dmax, z.get_dmax());
+    }
+
+    static lower_bound_type loosest(const lower_bound_type& b1, const lower_bound_type& b2){
+        return lower_bound_type::includes(b1, b2) ? b1 : b2;
+    }
+
+    static upper_bound_type loosest(const upper_bound_type& b1, const upper_bound_type& b2){
+        return upper_bound_type::includes(b1, b2) ? b1 : b2;
+    }
+
+    /*
+     *  Whether a and b (zones or summaries) may have a period in common.
+     */
+    template <class A, class B>
+    static bool overlap(const A& a, const B& b){
+        return bound<T>::is_valid_interval(
+                    lower_bound_type::intersection(a.get_bmin(), b.get_bmin()),
+                    upper_bound_type::intersection(a.get_bmax(), b.get_bmax())) and
+               bound<T>::is_valid_interval(
+                    lower_bound_type::intersection(a.get_emin(), b.get_emin()),
+                    upper_bound_type::intersection(a.get_emax(), b.get_emax())) and
+               bound<T>::is_valid_interval(
+                    lower_bound_type::intersection(a.get_dmin(), b.get_dmin()),
+                    upper_bound_type::intersection(a.get_dmax(), b.get_dmax()));
+    }
+
+    /*
+     *  Whether a period of a (a zone or summary) may end where a period of b begins.
+     */
+    template <class A, class B>
+    static bool meet(const A& a, const B& b){
+        return bound<T>::is_valid_interval(
+                    lower_bound_type::intersection(a.get_emin(), b.get_bmin()),
+                    upper_bound_type::intersection(a.get_emax(), b.get_bmax()));
+    }
+};
+
 template<
     typename T, 
     typename Container = std::vector< zone<T> > 
@@ -118,9 +199,47 @@ public:
     typedef zone_set<T, Container>               type;
     typedef zone_set<T, Container>               zone_set_type;
 
+    typedef zone_set_summary<T>                  summary_type;
+
 protected:
     Container container;
 
+    /*
+     *  Summary of the zones, kept up to date by add and push_back. Other
+     *  modifiers, including the non-const accessors, reset it to be recomputed.
+     */
+    mutable summary_type summary_cache;
+    mutable bool summarized = true;
+
+    /*
+     *  Length of a prefix of the zones known to be sorted by bmin, extended by
+     *  add and push_back, so that sort_by_bmin only sorts the zones after it.
+     */
+    size_type sorted_prefix = 0;
+
+    /*
+     *  Positions of the zones ordered by emin, see emin_order.
+     */
+    mutable std::vector<size_type> emin_cache;
+    mutable bool emin_ordered = false;
+
+    void invalidate(){
+        summarized = false;
+        sorted_prefix = 0;
+        emin_ordered = false;
+    }
+
+    /*
+     *  Updates the summary and the sorted prefix for z, about to be appended.
+     */
+    void track(const zone_type& z){
+        if(summarized){summary_cache.add(z);}
+        if(sorted_prefix == container.size() and (container.empty() or not (z.get_bmin() < container.back().get_bmin()))){
+            sorted_prefix++;
+        }
+        emin_ordered = false;
+    }
+
 public:
     // zone_set() : container() { }
 
@@ -160,9 +279,11 @@ public:
         return container.size();
     }
     iterator begin(){
+        invalidate();
         return container.begin();
     }
     iterator end(){
+        invalidate();
         return container.end();
     }
     const_iterator begin() const{
@@ -179,6 +300,7 @@ public:
     }
 
     reference front() {
+        invalidate();
         return container.front();
     }
 
@@ -187,6 +309,7 @@ public:
     }
 
     reference back() {
+        invalidate();
         return container.back();
     }
 
@@ -194,63 +317,142 @@ public:
         return container.back();
     }
 
+    /*
+     *  Sorts the zones after the sorted prefix, unless already sorted, and merges
+     *  them with it, e.g. in linear time for the two runs of a union.
+     */
     void sort_by_bmin(){
-        std::sort(begin(), end(), earlier_bmin<value_type>());
+        if(sorted_prefix == container.size()){
+            return;
+        }
+
+        auto middle = container.begin() + sorted_prefix;
+        if(not std::is_sorted(middle, container.end(), earlier_bmin<value_type>())){
+            std::sort(middle, container.end(), earlier_bmin<value_type>());
+        }
+        std::inplace_merge(container.begin(), middle, container.end(), earlier_bmin<value_type>());
+
+        sorted_prefix = container.size();
+        emin_ordered = false;
     }
 
     void sort_by_emin(){
-        std::sort(begin(), end(), earlier_emin<value_type>());
+        std::sort(container.begin(), container.end(), earlier_emin<value_type>());
+        sorted_prefix = 0;
+        emin_ordered = false;
+    }
+
+    bool is_sorted_by_bmin() const {
+        return sorted_prefix == container.size() or
+               std::is_sorted(container.cbegin(), container.cend(), earlier_bmin<value_type>());
     }
 
-    void is_sorted_by_bmin(){
-        std::is_sorted(begin(), end(), earlier_bmin<value_type>());
+    bool is_sorted_by_emin() const {
+        return std::is_sorted(container.cbegin(), container.cend(), earlier_emin<value_type>());
     }
 
-    void is_sorted_by_emin(){
-        std::is_sorted(begin(), end(), earlier_emin<value_type>());
+    /**
+     *  @brief  Positions of the zones ordered by emin
+     *
+     *  Computed on the first call and kept until the zone set changes, so that
+     *  an operand concatenated repeatedly, e.g. in a transitive closure, is
+     *  ordered once.
+     */
+    const std::vector<size_type>& emin_order() const {
+        if(not emin_ordered){
+            auto earlier = [&](size_type i, size_type j){
+                return container[i].get_emin() < container[j].get_emin();
+            };
+
+            emin_cache.resize(container.size());
+            std::iota(emin_cache.begin(), emin_cache.end(), size_type(0));
+            if(not std::is_sorted(emin_cache.begin(), emin_cache.end(), earlier)){
+                std::stable_sort(emin_cache.begin(), emin_cache.end(), earlier);
+            }
+            emin_ordered = true;
+        }
+        return emin_cache;
     }
 
     iterator erase(iterator position){
+        invalidate();
         return container.erase(position);
     }
 
     iterator erase(iterator first, iterator last){
+        invalidate();
         return container.erase(first, last);   
     }
     void clear(){
         container.clear();
+        summary_cache = summary_type();
+        summarized = true;
+        sorted_prefix = 0;
+        emin_ordered = false;
     }
     void push_back(const zone_type& z) {
+        track(z);
         container.push_back(z);
     }
     void push_back(zone_type&& z) {
+        track(z);
         container.push_back(std::move(z));
     }
     iterator insert(iterator pos, const zone_type& z) {
+        invalidate();
         return container.insert(pos, z);
     }
     iterator insert(const_iterator pos, const zone_type& z) {
+        invalidate();
         return container.insert(pos, z);
     }
     iterator insert(const_iterator pos, zone_type&& z ){
+        invalidate();
         return container.insert(pos, z);
     }
     template< class InputIt >
     void insert(iterator pos, InputIt first, InputIt last){
+        invalidate();
         container.insert(pos, first, last);
     }
     template< class InputIt >
     iterator insert(const_iterator pos, InputIt first, InputIt last){
+        invalidate();
         return container.insert(pos, first, last);
     }
 
     void add(const zone_type& z){
         if(!z.is_nonempty()){return;}
-        container.push_back(z);
+        push_back(z);
     }
     void add(zone_type&& z){
         if(!z.is_nonempty()){return;}
-        container.push_back(std::move(z));
+        push_back(std::move(z));
+    }
+
+    /**
+     *  @brief  Loosest bounds of the zones on begins, ends and durations
+     *
+     *  Kept up to date as zones are added, and recomputed in one pass otherwise.
+     */
+    const summary_type& summary() const {
+        if(not summarized){
+            summary_cache = summary_type();
+            for(auto it = container.cbegin(); it != container.cend(); it++){
+                summary_cache.add(*it);
+            }
+            summarized = true;
+        }
+        return summary_cache;
+    }
+
+    /**
+     *  @brief  End of the zones that may begin by b, the zone set being sorted by bmin
+     */
+    const_iterator begins_until(const upper_bound_type& b) const {
+        return std::partition_point(cbegin(), cend(), [&](const zone_type& z){
+            return bound<value_type>::is_valid_interval(z.get_bmin(), b);
+        });
     }
     void add(const std::array<value_type,6>& values, 
              const std::array<bool,6>& signs){
@@ -274,6 +476,34 @@ public:
         add(zone_type::make_from_period_both_anchor(begin, end));
     }
 
+    /**
+     *  @brief  Adds the zones of n periods in a single pass
+     *  @param  begins  Array of n period begins.
+     *  @param  ends    Array of n period ends.
+     *  @param  n       Number of periods.
+     *  @param  make    Zone constructor, e.g. &zone_type::make_from_period_rise_anchor
+     */
+    void add_periods(const value_type* begins, const value_type* ends, size_type n,
+                     zone_type (*make)(value_type, value_type)){
+        for(size_type i = 0; i < n; i++){
+            add(make(begins[i], ends[i]));
+        }
+    }
+
+    /**
+     *  @brief  Adds n zones given by their bounds, e.g. as returned by to_numpy
+     *  @param  values  Row-major n x 6 array of bound values (bmin, bmax, emin, emax, dmin, dmax).
+     *  @param  signs   Row-major n x 6 array of bound signs.
+     *  @param  n       Number of zones.
+     */
+    void add_zones(const value_type* values, const bool* signs, size_type n){
+        for(size_type i = 0; i < n; i++, values += 6, signs += 6){
+            add(zone_type::make(
+                {values[0], values[1], values[2], values[3], values[4], values[5]},
+                {signs[0], signs[1], signs[2], signs[3], signs[4], signs[5]}));
+        }
+    }
+
     zone_set<mpq_class> get_as_rationals() const{
         // Create an empty zone_set with rationals
         zone_set<mpq_class> zsq;
@@ -329,6 +559,15 @@ public:
             add(zone_type::make_from_period_both_anchor(qbegin, qend));
         }
     }
+    void add_string(const std::array<std::string, 6>& values, const std::array<bool, 6>& signs){
+        if(std::is_same<mpq_class,T>::value){
+            std::array<mpq_class, 6> qvalues;
+            for(std::size_t i = 0; i < 6; i++){
+                qvalues[i] = mpq_class(values[i]);
+            }
+            add(zone_type::make(qvalues, signs));
+        }
+    }
     // Note end:
 
     std::string toString() const {
@@ -342,34 +581,15 @@ public:
     }
 
     static zone_set_type filter(const zone_set_type &zs){
- 
-        zone_set_type active, active_temp;
+
         zone_set_type result = zone_set();
-  
+        maximal_zones<value_type> active;
+
         // for(const auto& z1 : zs){
         for(auto z1it = zs.cbegin(); z1it != zs.cend(); z1it++){
- 
-            bool already_included = std::any_of(active.begin(), active.end(), [z1it](zone_type &z2){return zone_type::includes(z2, *z1it);});
- 
-            if(!already_included){
- 
-                active.erase( std::remove_if(active.begin(), active.end(), [z1it](zone_type &z2){return zone_type::includes(*z1it, z2);}), active.end());
-                active.push_back(*z1it);
- 
-                active_temp.clear();
-                for(const auto& z2 : active){
-                    if( z2.get_bmax() < z1it->get_bmin()){
-                        result.push_back(z2);
-                    } else {
-                        active_temp.push_back(z2);
-                    }
-                }
-                active = active_temp;
-            }
-        }
-        for(const auto& z2 : active){
-            result.push_back(z2);
+            active.add(*z1it, z1it->get_bmin(), result);
         }
+        active.flush(result);
 
         result.sort_by_bmin();
         return result;
@@ -386,7 +606,18 @@ public:
             return false;
         }
 
-        auto act_1 = zone_set();
+        zone_block<value_type> act_1;
+        std::size_t kept = 4;
+
+        // Removes the zones of act_1 with z1.bmax < z2.bmin. These do not include
+        // z2 anyway, so they are only removed once act_1 has doubled in size.
+        auto expire = [&](const zone_type& z2){
+            if(act_1.size() >= 2 * kept){
+                act_1.expire(z2.get_bmin());
+                act_1.compact();
+                kept = std::max(act_1.size(), std::size_t(4));
+            }
+        };
 
         auto it1 = zs1.cbegin();
         auto it2 = zs2.cbegin();
@@ -397,8 +628,8 @@ public:
                 act_1.push_back(*it1);
                 it1++;
             } else {
-                act_1.erase( std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_bmax() < it2->get_bmin();}), act_1.end()); // remove if z1.bmax < z2.bmin
-                bool z2_incd = std::any_of(act_1.begin(), act_1.end(), [&](zone_type z1){return zone_type::includes(z1, *it2);});
+                expire(*it2);
+                bool z2_incd = act_1.any_includes(*it2);
                 if(!z2_incd){
                     return false;
                 }
@@ -406,8 +637,8 @@ public:
             }
         }
         while (it2 != zs2.cend() and not act_1.empty()) {
-            act_1.erase( std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_bmax() < it2->get_bmin();}), act_1.end()); // remove if z1.bmax < z2.bmin
-            bool z2_incd = std::any_of(act_1.begin(), act_1.end(), [&](zone_type z1){return zone_type::includes(z1, *it2);});
+            expire(*it2);
+            bool z2_incd = act_1.any_includes(*it2);
             if(!z2_incd){
                 return false;
             }
@@ -416,6 +647,66 @@ public:
         return true;
     }
 
+    /**
+     *  @brief  Tests which of n periods (begin, end) lie in a zone set, in a single sweep
+     *  @param  zs        Zone set.
+     *  @param  begins    Array of n period begins.
+     *  @param  ends      Array of n period ends.
+     *  @param  n         Number of periods.
+     *  @param  contained Output array of n flags, set for the periods contained in a zone of zs.
+     *  @param  limit     Number of periods not contained after which the sweep stops early,
+     *                    leaving the flags of the periods not tested unset.
+     *  @return The number of periods found not contained, at most limit + 1.
+     *
+     *  Periods are visited by begin and zones by bmin, and a zone is only tested
+     *  against the periods its begins cover.
+     */
+    static size_type contains_points(const zone_set_type& zs, const value_type* begins, const value_type* ends,
+                                     size_type n, bool* contained, size_type limit){
+
+        std::vector<size_type> order(n);
+        for(size_type i = 0; i < n; i++){
+            order[i] = i;
+        }
+        if(not std::is_sorted(begins, begins + n)){
+            std::stable_sort(order.begin(), order.end(), [&](size_type i, size_type j){return begins[i] < begins[j];});
+        }
+
+        const zone_set_type* sorted = &zs;
+        zone_set_type copy;
+        if(not std::is_sorted(zs.cbegin(), zs.cend(), earlier_bmin<value_type>())){
+            copy = zs;
+            copy.sort_by_bmin();
+            sorted = &copy;
+        }
+
+        std::fill(contained, contained + n, false);
+
+        sweep_list<value_type> active(&zone_type::get_bmax);
+        auto it = sorted->cbegin();
+        size_type excluded = 0;
+
+        for(size_type k = 0; k < n; k++){
+            const size_type i = order[k];
+            const value_type& b = begins[i];
+            const value_type& e = ends[i];
+
+            // Zones whose bmin admits the begin of the period
+            while(it != sorted->cend() and it->get_bmin().admits(b)){
+                active.push_back(*it);
+                it++;
+            }
+            active.expire(lower_bound_type::nonstrict(b));
+
+            contained[i] = active.any_contains(b, e);
+            if(not contained[i] and ++excluded > limit){
+                break;
+            }
+        }
+
+        return excluded;
+    }
+
     static zone_set_type intersection(zone_set_type&& zs1, zone_set_type&& zs2){
         return zone_set_type::intersection(std::move(zs1), std::move(zs2));
     }
@@ -433,324 +724,362 @@ public:
 
         zone_set_type result = zone_set();
 
-        zone_set_type act_1, act_2, act_r, act_r_temp;
+        const summary_type& s1 = zs1.summary();
+        const summary_type& s2 = zs2.summary();
+
+        if(not summary_type::overlap(s1, s2)){
+            return result;
+        }
+
+        sweep_list<value_type> act_1(&zone_type::get_bmax), act_2(&zone_type::get_bmax);
+        maximal_zones<value_type> act_r;
 
         // std::sort(zs1.begin(), zs1.end(), earlier_bmin<value_type>());
         // std::sort(zs2.begin(), zs2.end(), earlier_bmin<value_type>());
 
-        auto it1 = zs1.cbegin();
-        auto it2 = zs2.cbegin();
-
-        while(it1 != zs1.cend() and it2 != zs2.cend()) {
+        // Zones beginning after every zone of the other set are not visited
+        auto it1 = zs1.cbegin(), last1 = zs1.begins_until(s2.get_bmax());
+        auto it2 = zs2.cbegin(), last2 = zs2.begins_until(s1.get_bmax());
 
+        while(it1 != last1 and it2 != last2) {
 
             if (it1->get_bmin() < it2->get_bmin()){
-                act_1.push_back(*it1);
-                act_2.erase(std::remove_if(act_2.begin(), act_2.end(), [&](zone_type z2){return z2.get_bmax() < it1->get_bmin();}), act_2.end());
-
-                for(const auto& z2 : act_2){
-                    // result.add( zone_type::intersection(*it1, z2));
-
-                    auto kid = zone_type::intersection(*it1, z2);
-
-                    if( kid.is_nonempty() and 
-                        !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);} ))
-                    {
-                        act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                        act_r.push_back(kid);
-
-                        act_r_temp.clear();
-                        for(auto zr : act_r){
-                            if( zr.get_bmax() < it1->get_bmin()){
-                                result.push_back(zr);
-                            }
-                            else {
-                                act_r_temp.push_back(zr);
-                            }
-                        }
-                        act_r = act_r_temp;
-                    }
+                if(not summary_type::overlap(*it1, s2)){
+                    it1++;
+                    continue;
                 }
+                act_1.push_back(*it1);
+                act_2.expire(it1->get_bmin()); // remove if z2.bmax < z1.bmin
+
+                act_2.for_each([&](const zone_type& z2){
+                    act_r.add(zone_type::intersection(*it1, z2), it1->get_bmin(), result);
+                });
 
                 it1++;
 
             } else {
-
-                act_2.push_back(*it2);
-                act_1.erase(std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_bmax() < it2->get_bmin();}), act_1.end()); // remove if z1.emax < z2.bmin
-
-                for(const auto& z1 : act_1){
-                    // result.add( zone_type::intersection(z1, *it2));
-
-                    auto kid = zone_type::intersection(z1, *it2);
-
-                    if( kid.is_nonempty() and 
-                        !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                    {
-                        act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                        act_r.push_back(kid);
-
-                        act_r_temp.clear();
-                        for(auto zr : act_r){
-                            if( zr.get_bmax() < it2->get_bmin()){
-                                result.push_back(zr);
-                            }
-                            else {
-                                act_r_temp.push_back(zr);
-                            }
-                        }
-                        act_r = act_r_temp;
-                    }
+                if(not summary_type::overlap(s1, *it2)){
+                    it2++;
+                    continue;
                 }
+                act_2.push_back(*it2);
+                act_1.expire(it2->get_bmin()); // remove if z1.bmax < z2.bmin
+
+                act_1.for_each([&](const zone_type& z1){
+                    act_r.add(zone_type::intersection(z1, *it2), it2->get_bmin(), result);
+                });
 
                 it2++;
             }
         }
 
         /// Processing left-overs (if zs1 remains)
-        while(it1 != zs1.cend()){
-            act_2.erase(std::remove_if(act_2.begin(), act_2.end(), [&](zone_type z2){return z2.get_bmax() < it1->get_bmin();}), act_2.end());
-
-            for(const auto& z2 : act_2){
-                auto kid = zone_type::intersection(*it1, z2);
-
-                if( kid.is_nonempty() and 
-                    !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                {
-                    act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                    act_r.push_back(kid);
-
-                    act_r_temp.clear();
-                    for(const auto& zr : act_r){
-                        if( zr.get_bmax() < it1->get_bmin()){
-                            result.push_back(zr);
-                        }
-                        else {
-                            act_r_temp.push_back(zr);
-                        }
-                    }
-                    // std::cout << result.size() << std::endl;
-
-                    act_r = act_r_temp;
-                }
-            }
+        while(it1 != last1){
+            act_2.expire(it1->get_bmin());
+
+            act_2.for_each([&](const zone_type& z2){
+                act_r.add(zone_type::intersection(*it1, z2), it1->get_bmin(), result);
+            });
+
             it1++;
         }
 
+        /// Processing left-overs (if zs2 remains)
+        while(it2 != last2){
+            act_1.expire(it2->get_bmin());
 
+            act_1.for_each([&](const zone_type& z1){
+                act_r.add(zone_type::intersection(z1, *it2), it2->get_bmin(), result);
+            });
 
-        /// Processing left-overs (if zs2 remains)
-        while(it2 != zs2.cend()){
-            act_1.erase(std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_bmax() < it2->get_bmin();}), act_1.end()); // remove if z1.emax < z2.bmin
-
-            for(const auto& z1 : act_1){
-                auto kid = zone_type::intersection(z1, *it2);
-
-                if( kid.is_nonempty() and 
-                    !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                {
-                    act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                    act_r.push_back(kid);
-
-                    act_r_temp.clear();
-                    for(const auto& zr : act_r){
-                        if( zr.get_bmax() < it2->get_bmin()){
-                            result.push_back(zr);
-                        }
-                        else {
-                            act_r_temp.push_back(zr);
-                        }
-                    }
-                    act_r = act_r_temp;
-                }
-            }
             it2++;
         }
-        for(const auto& zr : act_r){
-            result.push_back(zr);
-        }
+
+        act_r.flush(result);
 
         result.sort_by_bmin();
         return result;
     }
 
-    static zone_set_type concatenation(const zone_set_type& _zs1, const zone_set_type& zs2){
+    static zone_set_type concatenation(const zone_set_type& zs1, const zone_set_type& zs2){
 
         zone_set_type result = zone_set();
 
-        zone_set_type act_1, act_2, act_r, act_r_temp;
+        const summary_type& s1 = zs1.summary();
+        const summary_type& s2 = zs2.summary();
+
+        if(not summary_type::meet(s1, s2)){
+            return result;
+        }
+
+        sweep_list<value_type> act_1(&zone_type::get_emax), act_2(&zone_type::get_bmax);
+        maximal_zones<value_type> act_r;
 
-        // Could be better?
-        auto zs1 = zone_set_type(_zs1);
-        std::sort(zs1.begin(), zs1.end(), earlier_emin<value_type>());
+        // Zones of zs1 are visited by emin through its cached order, instead of
+        // sorting a copy
+        const std::vector<size_type>& order1 = zs1.emin_order();
         // std::sort(zs2.begin(), zs2.end(), earlier_bmin<value_type>());
 
-        auto it1 = zs1.cbegin();
-        auto it2 = zs2.cbegin();
+        auto it1 = order1.cbegin();
+        auto it2 = zs2.cbegin(), last2 = zs2.begins_until(s1.get_emax());
 
-        while(it1 != zs1.cend() and it2 != zs2.cend()) {
+        while(it1 != order1.cend() and it2 != last2) {
 
-            if (it1->get_emin() < it2->get_bmin()){
-                act_1.push_back(*it1);
-                act_2.erase(std::remove_if(act_2.begin(), act_2.end(), [&](zone_type z2){return z2.get_bmax() < it1->get_emin();}), act_2.end());
-
-                for(const auto& z2 : act_2){
-                    // result.add( zone_type::concatenation(*it1, z2));
-
-                    auto kid = zone_type::concatenation(*it1, z2);
-
-                    if( kid.is_nonempty() and 
-                        !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                    {
-                        act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                        act_r.push_back(kid);
-
-                        act_r_temp.clear();
-                        for(auto zr : act_r){
-                            if( zr.get_bmax() < it1->get_bmin()){
-                                result.push_back(zr);
-                            }
-                            else {
-                                act_r_temp.push_back(zr);
-                            }
-                        }
-                        act_r = act_r_temp;
-                    }
+            const zone_type& z1 = zs1.container[*it1];
+
+            if (z1.get_emin() < it2->get_bmin()){
+                if(not summary_type::meet(z1, s2)){
+                    it1++;
+                    continue;
                 }
+                act_1.push_back(z1);
+                act_2.expire(z1.get_emin()); // remove if z2.bmax < z1.emin
+
+                act_2.for_each([&](const zone_type& z2){
+                    act_r.add(zone_type::concatenation(z1, z2), z1.get_bmin(), result);
+                });
 
                 it1++;
 
             } else {
-
-                act_2.push_back(*it2);
-                act_1.erase(std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_emax() < it2->get_bmin();}), act_1.end()); // remove if z1.emax < z2.bmin
-
-                for(const auto& z1 : act_1){
-                    // result.add( zone_type::concatenation(z1, *it2));
-
-                    auto kid = zone_type::concatenation(z1, *it2);
-
-                    if( kid.is_nonempty() and 
-                        !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                    {
-                        act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                        act_r.push_back(kid);
-
-                        act_r_temp.clear();
-                        for(auto zr : act_r){
-                            if( zr.get_bmax() < it2->get_bmin()){
-                                result.push_back(zr);
-                            }
-                            else {
-                                act_r_temp.push_back(zr);
-                            }
-                        }
-                        act_r = act_r_temp;
-                    }
+                if(not summary_type::meet(s1, *it2)){
+                    it2++;
+                    continue;
                 }
+                act_2.push_back(*it2);
+                act_1.expire(it2->get_bmin()); // remove if z1.emax < z2.bmin
+
+                act_1.for_each([&](const zone_type& z1){
+                    act_r.add(zone_type::concatenation(z1, *it2), it2->get_bmin(), result);
+                });
 
                 it2++;
             }
         }
 
         /// Processing left-overs (if zs1 remains)
-        while(it1 != zs1.cend()){
-            act_2.erase(std::remove_if(act_2.begin(), act_2.end(), [&](zone_type z2){return z2.get_bmax() < it1->get_bmin();}), act_2.end());
-
-            for(const auto& z2 : act_2){
-                auto kid = zone_type::concatenation(*it1, z2);
-
-                if( kid.is_nonempty() and 
-                    !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                {
-                    act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                    act_r.push_back(kid);
-
-                    act_r_temp.clear();
-                    for(const auto& zr : act_r){
-                        if( zr.get_bmax() < it1->get_bmin()){
-                            result.push_back(zr);
-                        }
-                        else {
-                            act_r_temp.push_back(zr);
-                        }
-                    }
-                    act_r = act_r_temp;
-                }
-            }
+        while(it1 != order1.cend()){
+            const zone_type& z1 = zs1.container[*it1];
+
+            act_2.expire(z1.get_bmin());
+
+            act_2.for_each([&](const zone_type& z2){
+                act_r.add(zone_type::concatenation(z1, z2), z1.get_bmin(), result);
+            });
+
             it1++;
         }
 
         /// Processing left-overs (if zs2 remains)
-        while(it2 != zs2.cend()){
-            act_1.erase(std::remove_if(act_1.begin(), act_1.end(), [&](zone_type z1){return z1.get_emax() < it2->get_bmin();}), act_1.end()); // remove if z1.emax < z2.bmin
-
-            for(const auto& z1 : act_1){
-                auto kid = zone_type::concatenation(z1, *it2);
-
-                if( kid.is_nonempty() and 
-                    !std::any_of(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(zr, kid);}))
-                {
-                    act_r.erase( std::remove_if(act_r.begin(), act_r.end(), [&kid](zone_type &zr){return zone_type::includes(kid, zr);}), act_r.end());
-                    act_r.push_back(kid);
-
-                    act_r_temp.clear();
-                    for(const auto& zr : act_r){
-                        if( zr.get_bmax() < it2->get_bmin()){
-                            result.push_back(zr);
-                        }
-                        else {
-                            act_r_temp.push_back(zr);
-                        }
-                    }
-                    act_r = act_r_temp;
-                }
-            }
+        while(it2 != last2){
+            act_1.expire(it2->get_bmin()); // remove if z1.emax < z2.bmin
+
+            act_1.for_each([&](const zone_type& z1){
+                act_r.add(zone_type::concatenation(z1, *it2), it2->get_bmin(), result);
+            });
+
             it2++;
         }
-        for(const auto& zr : act_r){
-            result.push_back(zr);
-        }
 
+        act_r.flush(result);
+
+        // Zones of zs1 are visited by emin, so the sweep may flush zones
+        // that a later zone includes
         result.sort_by_bmin();
-        return result;
+        return filter(result);
     }
 
-    static zone_set_type transitive_closure(const zone_set_type& zs){
+    /**
+     *  @brief  Zones of a zone set restricted to the durations admitted by dmax
+     *  @param  zs     A %zone_set
+     *  @param  dmax   Duration bound, the zone set being returned as is if unbounded
+     *  @return result A %zone_set
+     */
+    static zone_set_type bounded(const zone_set_type& zs, const upper_bound_type& dmax){
+        if(not (dmax.value < bound<value_type>::infinity())){
+            return zs;
+        }
+        return duration_restriction(zs, lower_bound_type::closed(0), dmax);
+    }
+
+    /**
+     *  @brief  Concatenation of zone sets, keeping the zones admitted by a duration bound
+     *  @param  zs1    A %zone_set
+     *  @param  zs2    A %zone_set
+     *  @param  dmax   Duration bound of the matches that are needed, e.g. from a restriction
+     *  @return result A %zone_set
+     *
+     *  Both parts of a match last at most as long as the match, so that the zones
+     *  of zs1 and zs2 are restricted before they are concatenated.
+     */
+    static zone_set_type concatenation(const zone_set_type& zs1, const zone_set_type& zs2,
+                                       const upper_bound_type& dmax){
+        return bounded(concatenation(bounded(zs1, dmax), bounded(zs2, dmax)), dmax);
+    }
+
+    static zone_set_type concatenation(const zone_set_type& zs1, const zone_set_type& zs2, const value_type dmax){
+        return concatenation(zs1, zs2, upper_bound_type::closed(dmax));
+    }
+
+    static zone_set_type concatenation_string(const zone_set_type& zs1, const zone_set_type& zs2,
+                                              const std::string &dmax){
+        if(std::is_same<mpq_class,T>::value){
+            return concatenation(zs1, zs2, upper_bound_type::closed(mpq_class(dmax)));
+        }else{
+            return zone_set();
+        }
+    }
+
+    /**
+     *  @brief  Zones of a zone set not included in a zone of another
+     *  @param  zs1    A %zone_set sorted by bmin
+     *  @param  zs2    A %zone_set sorted by bmin
+     *  @return result The zones of zs2 not included in any zone of zs1
+     */
+    static zone_set_type uncovered(const zone_set_type& zs1, const zone_set_type& zs2){
+
+        if(not summary_type::overlap(zs1.summary(), zs2.summary())){
+            return zs2;
+        }
 
         auto result = zone_set();
 
-        zone_set_type zplus = zs;
-        zone_set_type zlast = zs;
+        sweep_list<value_type> act_1(&zone_type::get_bmax);
 
-        zone_set_type znext;
+        auto it1 = zs1.cbegin();
 
-        while(true){
+        for(auto it2 = zs2.cbegin(); it2 != zs2.cend(); it2++){
 
-            znext = concatenation(zlast, zs);
-            // std::cout << znext << zplus << includes(zplus, znext) << std::endl;
+            // Zones of zs1 with bmin including z2.bmin
+            while(it1 != zs1.cend() and not (it2->get_bmin() < it1->get_bmin())){
+                act_1.push_back(*it1);
+                it1++;
+            }
 
-            if(not includes(zplus, znext)) {
-                zlast = znext;
-                zplus = set_union(zplus, znext);
-                znext.clear();
+            act_1.expire(it2->get_bmin()); // remove if z1.bmax < z2.bmin
 
-            } else {
+            bool z2_incd = act_1.any_includes(*it2);
+            if(not z2_incd){
+                result.push_back(*it2);
+            }
+        }
+
+        return result;
+    }
+
+    /**
+     *  @brief  Transitive closure (Kleene plus) of a zone set
+     *  @param  zs         A %zone_set
+     *  @param  max_rounds Maximal number of rounds, or 0 for no bound
+     *  @param  dmax       Duration bound of the zones that are needed, e.g. from a restriction
+     *  @return result     A %zone_set
+     *
+     *  Semi-naive evaluation: each round concatenates zs with only the frontier,
+     *  i.e. the zones found in the previous round that were not included in the
+     *  result yet. Throws std::runtime_error if the fixpoint is not reached within
+     *  max_rounds rounds. Zones longer than dmax are dropped in each round, as the
+     *  suffixes of a zone of the result are not longer than it, so that the rounds
+     *  stop once the frontier exceeds dmax.
+     */
+    static zone_set_type transitive_closure(const zone_set_type& zs, size_type max_rounds = 0,
+                                            const upper_bound_type& dmax = upper_bound_type::unbounded()){
+
+        const zone_set_type base = bounded(zs, dmax);
+        zone_set_type zplus = base;
+        zone_set_type frontier = base;
+
+        for(size_type rounds = 1; ; rounds++){
+
+            // base is the first operand, so that its emin order is computed once
+            frontier = uncovered(zplus, bounded(concatenation(base, frontier), dmax));
+
+            if(frontier.empty()){
                 break;
+            } else if(max_rounds != 0 and rounds >= max_rounds){
+                throw std::runtime_error(
+                    "transitive closure did not converge within " + std::to_string(max_rounds) + " rounds");
             }
-            
+
+            zplus = set_union(zplus, frontier);
         }
 
-    return zplus;
-}
+        return zplus;
+    }
+
+    /**
+     *  @brief  Transitive closure (Kleene plus) of a zone set by repeated squaring
+     *  @param  zs         A %zone_set
+     *  @param  max_rounds Maximal number of rounds, or 0 for no bound
+     *  @param  dmax       Duration bound of the zones that are needed, e.g. from a restriction
+     *  @return result     A %zone_set
+     *
+     *  After k rounds the result holds the concatenations of up to 2^k zones of zs,
+     *  so that long chains need a logarithmic number of rounds. Each round
+     *  concatenates the whole result with itself. Throws std::runtime_error if the
+     *  fixpoint is not reached within max_rounds rounds.
+     */
+    static zone_set_type transitive_closure_doubling(const zone_set_type& zs, size_type max_rounds = 0,
+                                                     const upper_bound_type& dmax = upper_bound_type::unbounded()){
+
+        zone_set_type zplus = bounded(zs, dmax);
+
+        for(size_type rounds = 1; ; rounds++){
+
+            auto znext = uncovered(zplus, bounded(concatenation(zplus, zplus), dmax));
+
+            if(znext.empty()){
+                break;
+            } else if(max_rounds != 0 and rounds >= max_rounds){
+                throw std::runtime_error(
+                    "transitive closure did not converge within " + std::to_string(max_rounds) + " rounds");
+            }
+
+            zplus = set_union(zplus, znext);
+        }
+
+        return zplus;
+    }
+
+    static zone_set_type transitive_closure(const zone_set_type& zs, size_type max_rounds, const value_type dmax){
+        return transitive_closure(zs, max_rounds, upper_bound_type::closed(dmax));
+    }
+
+    static zone_set_type transitive_closure_doubling(const zone_set_type& zs, size_type max_rounds,
+                                                     const value_type dmax){
+        return transitive_closure_doubling(zs, max_rounds, upper_bound_type::closed(dmax));
+    }
+
+    static zone_set_type transitive_closure_string(const zone_set_type& zs, size_type max_rounds,
+                                                   const std::string &dmax){
+        if(std::is_same<mpq_class,T>::value){
+            return transitive_closure(zs, max_rounds, upper_bound_type::closed(mpq_class(dmax)));
+        }else{
+            return zone_set();
+        }
+    }
+
+    static zone_set_type transitive_closure_doubling_string(const zone_set_type& zs, size_type max_rounds,
+                                                            const std::string &dmax){
+        if(std::is_same<mpq_class,T>::value){
+            return transitive_closure_doubling(zs, max_rounds, upper_bound_type::closed(mpq_class(dmax)));
+        }else{
+            return zone_set();
+        }
+    }
 
     static zone_set_type set_union(const zone_set_type& zs1, const zone_set_type& zs2){
 
         auto result = zone_set();
 
-        result.insert( result.end(), zs1.cbegin(), zs1.cend());
-        result.insert( result.end(), zs2.cbegin(), zs2.cend());
+        for(auto it = zs1.cbegin(); it != zs1.cend(); it++){
+            result.push_back(*it);
+        }
+        for(auto it = zs2.cbegin(); it != zs2.cend(); it++){
+            result.push_back(*it);
+        }
 
+        // Merges the runs of zs1 and zs2, both sorted by bmin
+        result.sort_by_bmin();
         return zone_set_type::filter(result);
     }
 
@@ -852,6 +1181,38 @@ public:
 
     }
 
+    /**
+     *  @brief  Complementation operation for a range of zones
+     *
+     *  @param  first  Iterator to the first %zone.
+     *  @param  last   Iterator past the last %zone.
+     *  @return result A %zone_set
+     *
+     *  Returns the intersection of the complements of the zones in [first, last).
+     *  Both halves of the range are complemented recursively and merged by a single
+     *  intersection, so that the intermediate results are balanced instead of
+     *  being folded one zone at a time. An empty range yields the universal zone.
+     */
+    static zone_set_type complementation(const_iterator first, const_iterator last){
+
+        auto n = std::distance(first, last);
+
+        if(n == 0){
+            auto result = zone_set();
+            result.add(zone_type::universal());
+            return result;
+        } else if(n == 1){
+            return zone_set_type::complementation(*first);
+        }
+
+        auto middle = std::next(first, n / 2);
+
+        auto left = zone_set_type::complementation(first, middle);
+        auto right = zone_set_type::complementation(middle, last);
+
+        return zone_set_type::intersection(left, right);
+    }
+
     /**
      *  @brief  Complementation operation for a zone set
      *
@@ -862,16 +1223,12 @@ public:
      */
     static zone_set_type complementation(const zone_set_type& zs){
 
-        auto result = zone_set();
+        auto universe = zone_set();
+        universe.add(zone_type::universal());
 
-        result.add(zone_type::universal());
+        auto complement = zone_set_type::complementation(zs.cbegin(), zs.cend());
 
-        for(auto z : zs){
-            auto nzs = zone_set_type::complementation(z);
-            result = zone_set_type::intersection(result, nzs);
-        }
-
-        return result;
+        return zone_set_type::intersection(universe, complement);
     }
 
     /**
@@ -885,14 +1242,13 @@ public:
      */
     static zone_set_type set_difference(const zone_set_type& zs1, const zone_set_type& zs2){
 
-        auto result = zone_set(zs1);
-
-        for(auto z : zs2){
-            auto nzs = zone_set_type::complementation(z);
-            result = zone_set_type::intersection(result, nzs);
+        if(not summary_type::overlap(zs1.summary(), zs2.summary())){
+            return zs1;
         }
 
-        return result;
+        auto complement = zone_set_type::complementation(zs2.cbegin(), zs2.cend());
+
+        return zone_set_type::intersection(zs1, complement);
     }
 
     /**
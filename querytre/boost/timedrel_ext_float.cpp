@@ -1,4 +1,5 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
 #include <gmpxx.h>
 #include <gmp.h>
 
@@ -19,6 +20,9 @@ PYBIND11_MODULE(timedrel_ext_float, m) {
     typedef lower_bound<T> lower_bound_type;
     typedef upper_bound<T> upper_bound_type;
 
+    // Value of unbounded bounds, e.g. for missing duration bounds
+    m.attr("infinity") = bound<T>::infinity();
+
     py::class_<lower_bound_type>(m, "lower_bound")
         .def(py::init<T, bool>())
         .def_readonly("value", &lower_bound_type::value)
@@ -40,6 +44,9 @@ PYBIND11_MODULE(timedrel_ext_float, m) {
     typedef zone<T> zone_type;
     typedef zone_set<T> zone_set_type;
 
+    // Contiguous buffers of T, converted by numpy if needed
+    typedef py::array_t<T, py::array::c_style | py::array::forcecast> array_type;
+
     py::class_<zone_type>(m, "zone")
         .def("bmin", &zone_type::get_bmin)
         .def("bmax", &zone_type::get_bmax)
@@ -65,37 +72,119 @@ PYBIND11_MODULE(timedrel_ext_float, m) {
         .def("add_from_period_rise_anchor", &zone_set_type::add_from_period_rise_anchor)
         .def("add_from_period_fall_anchor", &zone_set_type::add_from_period_fall_anchor)
         .def("add_from_period_both_anchor", &zone_set_type::add_from_period_both_anchor)
+        .def("add_periods", [](zone_set_type &s, array_type begins, array_type ends, const std::string &anchor) {
+                if(begins.ndim() != 1 or ends.ndim() != 1 or begins.shape(0) != ends.shape(0)){
+                    throw py::value_error("begins and ends must be one-dimensional arrays of the same length");
+                }
+                zone_type (*make)(T, T);
+                if(anchor.empty()){
+                    make = &zone_type::make_from_period;
+                } else if(anchor == "rise"){
+                    make = &zone_type::make_from_period_rise_anchor;
+                } else if(anchor == "fall"){
+                    make = &zone_type::make_from_period_fall_anchor;
+                } else if(anchor == "both"){
+                    make = &zone_type::make_from_period_both_anchor;
+                } else {
+                    throw py::value_error("Unknown anchor: Options are {rise, fall, both}");
+                }
+                s.add_periods(begins.data(), ends.data(), begins.shape(0), make);
+            }, py::arg("begins"), py::arg("ends"), py::arg("anchor") = "")
+        .def("add_zones", [](zone_set_type &s, array_type values, py::array_t<bool, py::array::c_style | py::array::forcecast> signs) {
+                if(values.ndim() != 2 or values.shape(1) != 6 or signs.ndim() != 2 or signs.shape(1) != 6
+                   or values.shape(0) != signs.shape(0)){
+                    throw py::value_error("values and signs must be (n, 6) arrays");
+                }
+                s.add_zones(values.data(), signs.data(), values.shape(0));
+                s.sort_by_bmin();
+            }, py::arg("values"), py::arg("signs"))
+        .def("contains_points", [](const zone_set_type &s, array_type begins, array_type ends) {
+                if(begins.ndim() != 1 or ends.ndim() != 1 or begins.shape(0) != ends.shape(0)){
+                    throw py::value_error("begins and ends must be one-dimensional arrays of the same length");
+                }
+                const std::size_t n = begins.shape(0);
+                py::array_t<bool> contained(n);
+                {
+                    py::gil_scoped_release release;
+                    zone_set_type::contains_points(s, begins.data(), ends.data(), n, contained.mutable_data(), n);
+                }
+                return contained;
+            }, py::arg("begins"), py::arg("ends"))
+        .def("includes_each", [](const zone_set_type &s, array_type begins, array_type ends, py::ssize_t limit) {
+                if(begins.ndim() != 1 or ends.ndim() != 1 or begins.shape(0) != ends.shape(0)){
+                    throw py::value_error("begins and ends must be one-dimensional arrays of the same length");
+                }
+                const std::size_t n = begins.shape(0);
+                py::array_t<bool> included(n);
+                std::size_t excluded;
+                {
+                    py::gil_scoped_release release;
+                    excluded = zone_set_type::contains_points(s, begins.data(), ends.data(), n, included.mutable_data(),
+                                                            limit < 0 ? n : static_cast<std::size_t>(limit));
+                }
+                return py::make_tuple(included, excluded);
+            }, py::arg("begins"), py::arg("ends"), py::arg("limit") = -1)
+        .def("to_numpy", [](py::object self) {
+                // Strided views over the bounds of the stored zones. The arrays keep the
+                // zone_set alive but become invalid if zones are added to it afterwards.
+                static_assert(sizeof(zone_type) == 6 * sizeof(bound<T>), "zone bounds are not contiguous");
+                const zone_set_type &s = self.cast<const zone_set_type&>();
+                const bound<T>* first = s.empty() ? nullptr : s.cbegin()->bounds();
+                const char* base = reinterpret_cast<const char*>(first);
+                const std::vector<py::ssize_t> shape = {static_cast<py::ssize_t>(s.size()), 6};
+                const std::vector<py::ssize_t> strides = {sizeof(zone_type), sizeof(bound<T>)};
+
+                py::array values(py::dtype::of<T>(), shape, strides,
+                    first ? reinterpret_cast<const T*>(base + offsetof(bound<T>, value)) : nullptr, self);
+                py::array signs(py::dtype::of<bool>(), shape, strides,
+                    first ? reinterpret_cast<const bool*>(base + offsetof(bound<T>, sign)) : nullptr, self);
+                values.attr("setflags")(py::arg("write") = false);
+                signs.attr("setflags")(py::arg("write") = false);
+
+                return py::make_tuple(values, signs);
+            })
         .def("empty", &zone_set_type::empty)
+        .def("__len__", &zone_set_type::size)
         .def("__iter__", [](const zone_set_type &s) { return py::make_iterator(s.cbegin(), s.cend()); },
                          py::keep_alive<0, 1>() /* Essential: keep object alive while iterator exists */)
         .def("__str__", &zone_set_type::toString)
     ;
 
-    m.def("filter", &zone_set_type::filter);
-    m.def("includes", &zone_set_type::includes);
+    // The operations below only read their arguments and run without the GIL, so
+    // that other Python threads can proceed. Their arguments must not be modified
+    // concurrently.
+    typedef py::call_guard<py::gil_scoped_release> release_gil;
+
+    m.def("filter", &zone_set_type::filter, release_gil());
+    m.def("includes", &zone_set_type::includes, release_gil());
 
     // Set operations
-    m.def<zone_set_type (*)(const zone_set_type&)>("complementation", &zone_set_type::complementation);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("duration_restriction", &zone_set_type::duration_restriction);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("union", &zone_set_type::set_union);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("intersection", &zone_set_type::intersection);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("difference", &zone_set_type::set_difference);
+    m.def<zone_set_type (*)(const zone_set_type&)>("complementation", &zone_set_type::complementation, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("duration_restriction", &zone_set_type::duration_restriction, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("union", &zone_set_type::set_union, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("intersection", &zone_set_type::intersection, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("difference", &zone_set_type::set_difference, release_gil());
 
     // Sequential operations
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("concatenation", &zone_set_type::concatenation);
-    m.def<zone_set_type (*)(const zone_set_type&)>("transitive_closure", &zone_set_type::transitive_closure);
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("concatenation", &zone_set_type::concatenation, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&, T)>("concatenation", &zone_set_type::concatenation,
+        py::arg("zs1"), py::arg("zs2"), py::arg("dmax"), release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, zone_set_type::size_type, T)>("transitive_closure", &zone_set_type::transitive_closure,
+        py::arg("zs"), py::arg("max_rounds") = 0, py::arg("dmax") = bound<T>::infinity(), release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, zone_set_type::size_type, T)>("transitive_closure_doubling", &zone_set_type::transitive_closure_doubling,
+        py::arg("zs"), py::arg("max_rounds") = 0, py::arg("dmax") = bound<T>::infinity(), release_gil());
 
     // Modal operations of the logic of time periods
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_starts", &zone_set_type::diamond_starts);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_started_by", &zone_set_type::diamond_started_by);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_finishes", &zone_set_type::diamond_finishes);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_finished_by", &zone_set_type::diamond_finished_by);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_meets", &zone_set_type::diamond_meets);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_met_by", &zone_set_type::diamond_met_by);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_starts", &zone_set_type::box_starts);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_started_by", &zone_set_type::box_started_by);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_finishes", &zone_set_type::box_finishes);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_finished_by", &zone_set_type::box_finished_by);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_meets", &zone_set_type::box_meets);
-    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_met_by", &zone_set_type::box_met_by);
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_starts", &zone_set_type::diamond_starts, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_started_by", &zone_set_type::diamond_started_by, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_finishes", &zone_set_type::diamond_finishes, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_finished_by", &zone_set_type::diamond_finished_by, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_meets", &zone_set_type::diamond_meets, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("diamond_met_by", &zone_set_type::diamond_met_by, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_starts", &zone_set_type::box_starts, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_started_by", &zone_set_type::box_started_by, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_finishes", &zone_set_type::box_finishes, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_finished_by", &zone_set_type::box_finished_by, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_meets", &zone_set_type::box_meets, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, T, T)>("box_met_by", &zone_set_type::box_met_by, release_gil());
 }
\ No newline at end of file
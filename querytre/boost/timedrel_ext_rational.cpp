@@ -1,6 +1,8 @@
 #include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
 #include <gmpxx.h>
 #include <gmp.h>
+#include <memory>
 
 #include "bound.hpp"
 #include "zone.hpp"
@@ -19,6 +21,9 @@ PYBIND11_MODULE(timedrel_ext_rational, m) {
     typedef lower_bound<T> lower_bound_type;
     typedef upper_bound<T> upper_bound_type;
 
+    // Value of unbounded bounds, e.g. for missing duration bounds
+    m.attr("infinity") = bound<T>::infinity().get_str();
+
     py::class_<lower_bound_type>(m, "lower_bound")
         .def(py::init<T, bool>())
         .def_readonly("value", &lower_bound_type::value)
@@ -69,37 +74,66 @@ PYBIND11_MODULE(timedrel_ext_rational, m) {
         .def("add_from_period_rise_anchor_string", &zone_set_type::add_from_period_rise_anchor_string)
         .def("add_from_period_fall_anchor_string", &zone_set_type::add_from_period_fall_anchor_string)
         .def("add_from_period_both_anchor_string", &zone_set_type::add_from_period_both_anchor_string)
+        .def("add_string", &zone_set_type::add_string)
+        .def("includes_each", [](const zone_set_type &s, const std::vector<std::string> &begins,
+                                 const std::vector<std::string> &ends, py::ssize_t limit) {
+                if(begins.size() != ends.size()){
+                    throw py::value_error("begins and ends must have the same length");
+                }
+                const std::size_t n = begins.size();
+                std::vector<T> qbegins(begins.begin(), begins.end());
+                std::vector<T> qends(ends.begin(), ends.end());
+                std::unique_ptr<bool[]> included(new bool[n]);
+                std::size_t excluded;
+                {
+                    py::gil_scoped_release release;
+                    excluded = zone_set_type::contains_points(s, qbegins.data(), qends.data(), n, included.get(),
+                                                            limit < 0 ? n : static_cast<std::size_t>(limit));
+                }
+                return py::make_tuple(std::vector<bool>(included.get(), included.get() + n), excluded);
+            }, py::arg("begins"), py::arg("ends"), py::arg("limit") = -1)
         .def("empty", &zone_set_type::empty)
+        .def("__len__", &zone_set_type::size)
         .def("__iter__", [](const zone_set_type &s) { return py::make_iterator(s.cbegin(), s.cend()); },
                          py::keep_alive<0, 1>() /* Essential: keep object alive while iterator exists */)
         .def("__str__", &zone_set_type::toString)
     ;
 
-    m.def("filter", &zone_set_type::filter);
-    m.def("includes", &zone_set_type::includes);
+    // The operations below only read their arguments and run without the GIL, so
+    // that other Python threads can proceed. Their arguments must not be modified
+    // concurrently.
+    typedef py::call_guard<py::gil_scoped_release> release_gil;
+
+    m.def("filter", &zone_set_type::filter, release_gil());
+    m.def("includes", &zone_set_type::includes, release_gil());
 
     // Set operations
-    m.def<zone_set_type (*)(const zone_set_type&)>("complementation", &zone_set_type::complementation);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string &, const std::string &)>("duration_restriction", &zone_set_type::duration_restriction_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("union", &zone_set_type::set_union);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("intersection", &zone_set_type::intersection);
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("difference", &zone_set_type::set_difference);
+    m.def<zone_set_type (*)(const zone_set_type&)>("complementation", &zone_set_type::complementation, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string &, const std::string &)>("duration_restriction", &zone_set_type::duration_restriction_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("union", &zone_set_type::set_union, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("intersection", &zone_set_type::intersection, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("difference", &zone_set_type::set_difference, release_gil());
 
     // Sequential operations
-    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("concatenation", &zone_set_type::concatenation);
-    m.def<zone_set_type (*)(const zone_set_type&)>("transitive_closure", &zone_set_type::transitive_closure);
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&)>("concatenation", &zone_set_type::concatenation, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const zone_set_type&, const std::string&)>("concatenation", &zone_set_type::concatenation_string,
+        py::arg("zs1"), py::arg("zs2"), py::arg("dmax"), release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, zone_set_type::size_type, const std::string&)>("transitive_closure", &zone_set_type::transitive_closure_string,
+        py::arg("zs"), py::arg("max_rounds") = 0, py::arg("dmax") = bound<T>::infinity().get_str(), release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, zone_set_type::size_type, const std::string&)>("transitive_closure_doubling", &zone_set_type::transitive_closure_doubling_string,
+        py::arg("zs"), py::arg("max_rounds") = 0, py::arg("dmax") = bound<T>::infinity().get_str(), release_gil());
 
     // Modal operations of the logic of time periods
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_starts", &zone_set_type::diamond_starts_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_started_by", &zone_set_type::diamond_started_by_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_finishes", &zone_set_type::diamond_finishes_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_finished_by", &zone_set_type::diamond_finished_by_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_meets", &zone_set_type::diamond_meets_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_met_by", &zone_set_type::diamond_met_by_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_starts", &zone_set_type::box_starts_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_started_by", &zone_set_type::box_started_by_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_finishes", &zone_set_type::box_finishes_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_finished_by", &zone_set_type::box_finished_by_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_meets", &zone_set_type::box_meets_string);
-    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_met_by", &zone_set_type::box_met_by_string);
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_starts", &zone_set_type::diamond_starts_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_started_by", &zone_set_type::diamond_started_by_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_finishes", &zone_set_type::diamond_finishes_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_finished_by", &zone_set_type::diamond_finished_by_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_meets", &zone_set_type::diamond_meets_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("diamond_met_by", &zone_set_type::diamond_met_by_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_starts", &zone_set_type::box_starts_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_started_by", &zone_set_type::box_started_by_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_finishes", &zone_set_type::box_finishes_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_finished_by", &zone_set_type::box_finished_by_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_meets", &zone_set_type::box_meets_string, release_gil());
+    m.def<zone_set_type (*)(const zone_set_type&, const std::string&, const std::string&)>("box_met_by", &zone_set_type::box_met_by_string, release_gil());
 }
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def read(path, chunksize=100000, index_col=None, columns=None):
+    """Yields the rows of a CSV, Parquet or NPY file as DataFrames of chunksize rows.
+
+    The format is chosen by the extension of path. Rows must be ordered by time.
+    The index of the DataFrames is the column index_col if given, and the row
+    number otherwise. columns selects the columns to read, or names the columns
+    of a 2d array.
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.csv':
+        return read_csv(path, chunksize, index_col, columns)
+    elif extension in ('.parquet', '.pq'):
+        return read_parquet(path, chunksize, index_col, columns)
+    elif extension == '.npy':
+        return read_npy(path, chunksize, index_col, columns)
+    else:
+        raise ValueError("Unknown file format: Options are {.csv, .parquet, .npy}")
+
+
+def read_csv(path, chunksize=100000, index_col=None, columns=None, **kwargs):
+    """Yields the rows of a CSV file, keyword arguments being passed to pandas.read_csv."""
+    columns = with_index(columns, index_col)
+
+    start = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize, usecols=columns, **kwargs):
+        yield indexed(chunk, start, index_col)
+        start += len(chunk)
+
+
+def read_parquet(path, chunksize=100000, index_col=None, columns=None):
+    """Yields the rows of a Parquet file, which requires pyarrow."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Reading Parquet files requires pyarrow") from e
+
+    columns = with_index(columns, index_col)
+
+    start = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        yield indexed(batch.to_pandas(), start, index_col)
+        start += batch.num_rows
+
+
+def read_npy(path, chunksize=100000, index_col=None, columns=None):
+    """Yields the rows of a 2d or structured array saved by numpy.save.
+
+    The file is memory mapped, so that only one chunk is in memory at a time. The
+    columns of a 2d array are named by columns, those of a structured array by its
+    fields.
+    """
+    array = np.load(path, mmap_mode='r')
+
+    for start in range(0, len(array), chunksize):
+        chunk = pd.DataFrame(np.array(array[start:start + chunksize]), columns=columns)
+        yield indexed(chunk, start, index_col)
+
+
+def with_index(columns, index_col):
+    if columns is not None and index_col is not None and index_col not in columns:
+        return list(columns) + [index_col]
+    return columns
+
+
+def indexed(df, start, index_col):
+    if index_col is not None:
+        return df.set_index(index_col)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
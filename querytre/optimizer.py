@@ -0,0 +1,172 @@
+from querytre.plan import Parameter, node
+
+
+def rewrite(plan, sizes=None):
+    """Returns a plan equivalent to plan that is cheaper to evaluate.
+
+    The rewrite rules preserve the periods matched by the query and apply to any
+    plan. Given sizes, a dict from atom names to zone counts, a cost model also
+    chooses among equivalent plans, e.g. the operand a restriction is pushed into.
+    """
+    return Rewriter(sizes).rewrite(plan)
+
+
+def estimate(plan, sizes):
+    """Returns a rough estimate of the number of zones computed by plan."""
+    op, children = plan.op, [estimate(child, sizes) for child in plan.children]
+
+    if op in ('Atomic', 'RiseAtomic', 'FallAtomic', 'DualAtomic'):
+        return sizes.get(plan.args[0], 1)
+    elif op == 'True':
+        return 1
+    elif op == 'Intersection':
+        return min(children)
+    elif op in ('Union', 'Difference'):
+        return sum(children)
+    elif op == 'Concatenation':
+        return max(children)
+    elif op in ('Star', 'Plus'):
+        return 8 * children[0]
+    else:
+        return children[0]
+
+
+def tighter(bound1, bound2, pick):
+    if bound1 is None:
+        return bound2
+    elif bound2 is None:
+        return bound1
+    return pick(bound1, bound2)
+
+
+def mergeable(bounds):
+    return not any(isinstance(bound, Parameter) for bound in bounds)
+
+
+def restriction(child, lower, upper):
+    if child.op == 'Restriction' and mergeable(child.args + (lower, upper)):
+        child_lower, child_upper = child.args
+        return node('Restriction', child.children[0],
+                    args=(tighter(lower, child_lower, max), tighter(upper, child_upper, min)))
+    return node('Restriction', child, args=(lower, upper))
+
+
+def hinted(n, upper):
+    """Returns n with the duration bound upper passed to its concatenations and closures.
+
+    The operands of the concatenations and closures are restricted to upper, as
+    the parts of a zone are not longer than it.
+    """
+    if n.op == 'Concatenation':
+        children = [hinted(child, upper) if child.op == 'Concatenation' else restriction(child, None, upper)
+                    for child in n.children]
+        return node('Concatenation', *children, args=(upper,))
+    return node(n.op, restriction(n.children[0], None, upper), args=(upper,))
+
+
+def loosely_hinted(n, upper):
+    if upper is None or isinstance(upper, Parameter):
+        return False
+    return not n.args or upper < n.args[0]
+
+
+class Rewriter(object):
+    """Rewrites plans bottom-up, applying the rules to each node until none applies.
+
+    Every rule either removes a node, removes a complementation or moves a
+    restriction towards the atoms, so that rewriting terminates.
+    """
+
+    def __init__(self, sizes=None):
+        self.sizes = sizes
+        self.nodes = {}
+
+    def rewrite(self, plan):
+        if plan not in self.nodes:
+            children = [self.rewrite(child) for child in plan.children]
+            result = self.simplify(node(plan.op, *children, args=plan.args))
+            self.nodes[plan] = self.nodes.setdefault(result, result)
+        return self.nodes[plan]
+
+    def simplify(self, n):
+        rule = getattr(self, 'rewrite' + n.op, None)
+        result = None if rule is None else rule(n, *n.children)
+        return n if result is None else self.rewrite(result)
+
+    def rewriteComplementation(self, n, child):
+        # ~~e = e
+        if child.op == 'Complementation':
+            return child.children[0]
+
+    def rewriteIntersection(self, n, left, right):
+        # e & e = e, e & True = e
+        if left == right or right.op == 'True':
+            return left
+        elif left.op == 'True':
+            return right
+        # ~a & ~b = ~(a | b)
+        elif left.op == right.op == 'Complementation':
+            return node('Complementation', node('Union', left.children[0], right.children[0]))
+
+    def rewriteUnion(self, n, left, right):
+        # e | e = e, e | True = True
+        if left == right or left.op == 'True':
+            return left
+        elif right.op == 'True':
+            return right
+        # ~a | ~b = ~(a & b)
+        elif left.op == right.op == 'Complementation':
+            return node('Complementation', node('Intersection', left.children[0], right.children[0]))
+
+    def rewriteDifference(self, n, left, right):
+        # a / ~b = a & b
+        if right.op == 'Complementation':
+            return node('Intersection', left, right.children[0])
+        # ~a / b = ~(a | b)
+        elif left.op == 'Complementation':
+            return node('Complementation', node('Union', left.children[0], right))
+
+    def rewriteRestriction(self, n, child):
+        lower, upper = n.args
+        # e[:] = e, as all the zones have positive durations
+        if lower is None and upper is None:
+            return child
+        # e[a:b][c:d] = e[max(a, c):min(b, d)]
+        elif child.op == 'Restriction' and mergeable(child.args + n.args):
+            return restriction(child, lower, upper)
+        # (a | b)[l:u] = a[l:u] | b[l:u]
+        elif child.op == 'Union':
+            left, right = child.children
+            return node('Union', restriction(left, lower, upper), restriction(right, lower, upper))
+        # (a / b)[l:u] = a[l:u] / b
+        elif child.op == 'Difference':
+            left, right = child.children
+            return node('Difference', restriction(left, lower, upper), right)
+        # (a;b)[l:u] = (a[:u];b[:u])[l:u], computing the zones up to u long only
+        elif child.op in ('Concatenation', 'Star', 'Plus') and loosely_hinted(child, upper):
+            return node('Restriction', hinted(child, upper), args=n.args)
+        # (a & b)[l:u] = a[l:u] & b, restricting the larger operand
+        elif child.op == 'Intersection' and self.sizes is not None:
+            left, right = child.children
+            if estimate(left, self.sizes) >= estimate(right, self.sizes):
+                return node('Intersection', restriction(left, lower, upper), right)
+            else:
+                return node('Intersection', left, restriction(right, lower, upper))
+
+    def rewriteBox(self, n, child):
+        # [R]e = ~<R>~e, so that the complementations can cancel out
+        return node('Complementation', node('Diamond', node('Complementation', child), args=n.args))
+
+    def rewriteStar(self, n, child):
+        # e** = e+* = e*
+        if child.op in ('Star', 'Plus'):
+            return node('Star', child.children[0])
+
+    def rewritePlus(self, n, child):
+        # e++ = e+, e*+ = e*
+        if child.op in ('Star', 'Plus'):
+            return child
+
+    def rewriteQuestion(self, n, child):
+        # e? is evaluated as e
+        return child
@@ -0,0 +1,41 @@
+def intersection_order(sizes):
+    """Returns the indices of the operands of an intersection, smallest first.
+
+    Intersections are commutative, and the result is never larger than the smallest
+    operand, so that folding from the smallest keeps the intermediate results small.
+    """
+    return sorted(range(len(sizes)), key=sizes.__getitem__)
+
+
+def concatenation_order(sizes):
+    """Returns a bracketing of a chain of concatenations as nested pairs of indices.
+
+    Concatenations are associative, but the cost of a chain depends on the sizes of
+    the intermediate results. Each concatenation is costed as the sum of the sizes
+    of its operands, and the size of a concatenation is estimated by the smallest
+    size in its chain. The cheapest bracketing is found by dynamic programming, e.g.
+    sizes [1000, 1000, 10] give (0, (1, 2)).
+    """
+    n = len(sizes)
+    estimate = [[0] * n for _ in range(n)]
+    cost = [[0] * n for _ in range(n)]
+    split = [[0] * n for _ in range(n)]
+
+    for i in range(n):
+        estimate[i][i] = sizes[i]
+        for j in range(i + 1, n):
+            estimate[i][j] = min(estimate[i][j - 1], sizes[j])
+
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            cost[i][j], split[i][j] = min(
+                (cost[i][k] + cost[k + 1][j] + estimate[i][k] + estimate[k + 1][j], k) for k in range(i, j))
+
+    def bracketing(i, j):
+        if i == j:
+            return i
+        k = split[i][j]
+        return bracketing(i, k), bracketing(k + 1, j)
+
+    return bracketing(0, n - 1)
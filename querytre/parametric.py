@@ -0,0 +1,59 @@
+from querytre import plan
+from querytre.query import DTYPES, QueryEvaluator, compile, num_false_negatives
+
+
+def eval_grid(df, expr, points, timescale=1, dtype="int", **kwargs):
+    """Yields the zone set of expr for each dict of parameter values in points.
+
+    See ParametricQuery, e.g. eval_grid(df, "(p;q)[l:u]", [{"l": 1, "u": 5}, ...]).
+    """
+    query = ParametricQuery(df, expr, timescale=timescale, dtype=dtype, **kwargs)
+    for values in points:
+        yield query.eval(**values)
+
+
+class ParametricQuery(object):
+    """A query whose restriction bounds are parameters, e.g. (p;q)[l:u], over a DataFrame.
+
+    The subexpressions that do not depend on the parameters (e.g. p;q) are
+    evaluated once and kept across evaluations, so that each parameter point only
+    re-evaluates the operators above a parameterized restriction. Parameter values
+    are in the units of the expression, i.e. scaled by timescale.
+    """
+
+    def __init__(self, df, expr, timescale=1, dtype="int", closure="seminaive", max_rounds=0, **kwargs):
+        kwargs['timescale'] = timescale
+
+        self.dtype = DTYPES[dtype]
+        self.plan = compile(expr, dtype)
+        self.parameters = plan.parameters(self.plan)
+        self.evaluator = QueryEvaluator(df, dtype, closure=closure, max_rounds=max_rounds, **kwargs)
+        self.static = set()
+        self.collect_static(self.plan)
+
+    def collect_static(self, node):
+        """Adds the nodes of node without parameters to self.static, returns whether node has none."""
+        static = all([self.collect_static(child) for child in node.children])
+        static = static and not any(isinstance(arg, plan.Parameter) for arg in node.args)
+        if static:
+            self.static.add(node)
+        return static
+
+    def eval(self, **values):
+        """Returns the zone set of the query for the given parameter values."""
+        values = {name: self.dtype(value) for name, value in values.items()}
+        # The bound plan is not rewritten, which could change the nodes without
+        # parameters, e.g. by passing them duration bounds
+        bound_plan = plan.bind(self.plan, values)
+
+        try:
+            return self.evaluator.visit(bound_plan)
+        finally:
+            # Only the results that do not depend on the parameters are reused
+            results = self.evaluator.results
+            for node in [node for node in results if node not in self.static]:
+                del results[node]
+
+    def num_false_negatives_bound(self, labels, fn_bound, **values):
+        """As query.num_false_negatives_bound, for the given parameter values."""
+        return num_false_negatives(self.eval(**values), labels, fn_bound) <= fn_bound
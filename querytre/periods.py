@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def mask(df, predicate):
+    """Evaluates predicate over the rows of df as a boolean array.
+
+    The predicate is first applied to the whole DataFrame (e.g. `lambda r: r.x > 0`
+    returns a boolean Series). Predicates that only work on single rows fall back
+    to the slower row-by-row loop over `df.itertuples()`.
+    """
+    try:
+        values = np.asarray(predicate(df))
+    except Exception:
+        values = None
+
+    if values is not None and values.dtype == np.bool_ and values.shape == (len(df),):
+        return values
+
+    return np.fromiter((predicate(row) for row in df.itertuples()), dtype=bool, count=len(df))
+
+
+def from_mask(index, values):
+    """Returns the arrays (begins, ends) of the periods where values holds.
+
+    A period begins at the index of a rising edge and ends at the index of the next
+    falling edge, or at the last index if values still holds at the end.
+    """
+    index = np.asarray(index)
+    values = np.asarray(values, dtype=bool)
+
+    if len(values) == 0:
+        return index[:0], index[:0]
+
+    edges = np.diff(values.astype(np.int8), prepend=np.int8(0))
+    begins = index[edges == 1]
+    ends = index[edges == -1]
+
+    if values[-1]:
+        ends = np.append(ends, index[-1])
+
+    return begins, ends
+
+
+def collect(df, predicate):
+    """Returns the arrays (begins, ends) of the periods of df where predicate holds."""
+    return from_mask(df.index.to_numpy(), mask(df, predicate))
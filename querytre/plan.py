@@ -0,0 +1,187 @@
+from collections import namedtuple
+
+from querytre.parser.QueryParser import QueryParser
+from querytre.parser.QueryVisitor import QueryVisitor
+
+
+# A node of a query plan. op is the label of the grammar rule (e.g. "Concatenation"),
+# children the tuple of operand nodes and args the tuple of the other operands:
+#   Atomic, RiseAtomic, FallAtomic, DualAtomic: (name,)
+#   Restriction:                                (lower, upper)
+#   Diamond, Box:                               (relation, lower, upper)
+#   Concatenation, Star, Plus:                  () or (dmax,), a bound on the durations
+#                                               of the zones needed (see optimizer)
+# Missing bounds are None, and bounds named in the expression (e.g. p[l:u]) are
+# Parameters. Nodes are immutable and hashable, so that a plan can be shared
+# between evaluations.
+Node = namedtuple('Node', ['op', 'children', 'args'])
+
+Parameter = namedtuple('Parameter', ['name'])
+
+
+def node(op, *children, args=()):
+    return Node(op, tuple(children), tuple(args))
+
+
+class PlanBuilder(QueryVisitor):
+    """Translates a parse tree into a plan, converting numbers to dtype.
+
+    Equal subtrees are built once and shared, so that the plan is a DAG.
+    """
+
+    def __init__(self, dtype=int):
+        self.dtype = dtype
+        self.nodes = {}
+
+    def node(self, op, *children, args=()):
+        n = node(op, *children, args=args)
+        return self.nodes.setdefault(n, n)
+
+    def number(self, token):
+        if token is None:
+            return None
+        elif not token.text[0].isdigit():
+            # Identifiers in bounds are parsed as numbers, see query.parameterize
+            return Parameter(token.text)
+        return self.dtype(token.text)
+
+    # Visit a parse tree produced by QueryParser#True.
+    def visitTrue(self, ctx: QueryParser.TrueContext):
+        return self.node('True')
+
+    # Visit a parse tree produced by QueryParser#Atomic.
+    def visitAtomic(self, ctx: QueryParser.AtomicContext):
+        return self.node('Atomic', args=(ctx.name.text,))
+
+    # Visit a parse tree produced by QueryParser#RiseAtomic.
+    def visitRiseAtomic(self, ctx: QueryParser.RiseAtomicContext):
+        return self.node('RiseAtomic', args=(ctx.name.text,))
+
+    # Visit a parse tree produced by QueryParser#FallAtomic.
+    def visitFallAtomic(self, ctx: QueryParser.FallAtomicContext):
+        return self.node('FallAtomic', args=(ctx.name.text,))
+
+    # Visit a parse tree produced by QueryParser#DualAtomic.
+    def visitDualAtomic(self, ctx: QueryParser.DualAtomicContext):
+        return self.node('DualAtomic', args=(ctx.name.text,))
+
+    # Visit a parse tree produced by QueryParser#Star.
+    def visitStar(self, ctx: QueryParser.StarContext):
+        return self.node('Star', self.visit(ctx.child))
+
+    # Visit a parse tree produced by QueryParser#Plus.
+    def visitPlus(self, ctx: QueryParser.PlusContext):
+        return self.node('Plus', self.visit(ctx.child))
+
+    # Visit a parse tree produced by QueryParser#Question.
+    def visitQuestion(self, ctx: QueryParser.QuestionContext):
+        return self.node('Question', self.visit(ctx.child))
+
+    # Visit a parse tree produced by QueryParser#Complementation.
+    def visitComplementation(self, ctx: QueryParser.ComplementationContext):
+        return self.node('Complementation', self.visit(ctx.child))
+
+    # Visit a parse tree produced by QueryParser#Restriction.
+    def visitRestriction(self, ctx: QueryParser.RestrictionContext):
+        return self.node('Restriction', self.visit(ctx.child), args=(self.number(ctx.l), self.number(ctx.u)))
+
+    # Visit a parse tree produced by QueryParser#Concatenation.
+    def visitConcatenation(self, ctx: QueryParser.ConcatenationContext):
+        return self.node('Concatenation', self.visit(ctx.left), self.visit(ctx.right))
+
+    # Visit a parse tree produced by QueryParser#Union.
+    def visitUnion(self, ctx: QueryParser.UnionContext):
+        return self.node('Union', self.visit(ctx.left), self.visit(ctx.right))
+
+    # Visit a parse tree produced by QueryParser#Intersection.
+    def visitIntersection(self, ctx: QueryParser.IntersectionContext):
+        return self.node('Intersection', self.visit(ctx.left), self.visit(ctx.right))
+
+    # Visit a parse tree produced by QueryParser#Difference.
+    def visitDifference(self, ctx: QueryParser.DifferenceContext):
+        return self.node('Difference', self.visit(ctx.left), self.visit(ctx.right))
+
+    # Visit a parse tree produced by QueryParser#Diamond.
+    def visitDiamond(self, ctx: QueryParser.DiamondContext):
+        return self.node('Diamond', self.visit(ctx.child), args=(self.relation(ctx), None, None))
+
+    # Visit a parse tree produced by QueryParser#Box.
+    def visitBox(self, ctx: QueryParser.BoxContext):
+        return self.node('Box', self.visit(ctx.child), args=(self.relation(ctx), None, None))
+
+    # Visit a parse tree produced by QueryParser#Grouping.
+    def visitGrouping(self, ctx: QueryParser.GroupingContext):
+        return self.visit(ctx.child)
+
+    def relation(self, ctx):
+        return ctx.relation.text + ('' if ctx.inverse is None else ctx.inverse.text)
+
+
+def atoms(plan):
+    """Returns the set of the names of the atoms of plan."""
+    if plan.op in ('Atomic', 'RiseAtomic', 'FallAtomic', 'DualAtomic'):
+        return {plan.args[0]}
+    return set().union(*(atoms(child) for child in plan.children))
+
+
+def parameters(plan):
+    """Returns the set of the names of the parameters of plan."""
+    names = {arg.name for arg in plan.args if isinstance(arg, Parameter)}
+    return names.union(*(parameters(child) for child in plan.children))
+
+
+def bind(plan, values):
+    """Returns plan with its parameters replaced by values, a dict from names to numbers."""
+    def bound(arg):
+        if not isinstance(arg, Parameter):
+            return arg
+        elif arg.name not in values:
+            raise ValueError("Unbound parameter: " + arg.name)
+        return values[arg.name]
+
+    return node(plan.op, *(bind(child, values) for child in plan.children), args=map(bound, plan.args))
+
+
+def operators(plan):
+    """Returns the set of the operators (node labels) of plan."""
+    return {plan.op}.union(*(operators(child) for child in plan.children))
+
+
+def max_duration(plan):
+    """Returns an upper bound on the durations of the zones of plan, None if unbounded.
+
+    The bound follows from the duration restrictions of the plan, e.g. the zones of
+    p[:5];q[:3] last at most 8. It holds whatever the zones of the atoms are.
+    """
+    op, bounds = plan.op, [max_duration(child) for child in plan.children]
+
+    if op == 'Restriction':
+        bounds.append(plan.args[1])
+    elif op == 'Difference':
+        bounds = bounds[:1]
+    elif op in ('Union', 'Concatenation'):
+        if None in bounds:
+            return None
+        return max(bounds) if op == 'Union' else sum(bounds)
+    elif op not in ('Intersection', 'Question'):
+        return None
+
+    bounds = [bound for bound in bounds if bound is not None]
+    return min(bounds) if bounds else None
+
+
+def chain(plan):
+    """Returns the operands of the chain of plan.op operations rooted at plan.
+
+    For example, the chain of (a & b) & (c & d) is [a, b, c, d]. Operands are
+    returned in order, so that chains of associative operations can be regrouped.
+    """
+    if not plan.children:
+        return [plan]
+    return [operand for child in plan.children
+            for operand in (chain(child) if (child.op, child.args) == (plan.op, plan.args) else [child])]
+
+
+def build(tree, dtype=int):
+    """Returns the plan of a parse tree produced by QueryParser#expr."""
+    return PlanBuilder(dtype).visit(tree)
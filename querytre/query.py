@@ -1,55 +1,226 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from fractions import Fraction
+from functools import lru_cache
+from threading import Lock
 from typing import Union
 
+import numpy as np
 from antlr4 import *
-from mpl_toolkits.axes_grid1.axes_size import Fraction
 
 from querytre.parser.QueryLexer import QueryLexer
 from querytre.parser.QueryParser import QueryParser
-from querytre.parser.QueryVisitor import QueryVisitor
 
 # import intervals
-from querytre import zoneset, zonesetf, zonesetq
+from querytre import zoneset, zonesetf, zonesetq, periods, plan, optimizer
 
+DTYPES = {"int": int, "float": float, "rational": Fraction}
+
+
+@lru_cache(maxsize=256)
+def compile(expr, dtype="int", optimize=True):
+    """Parses expr into a plan (see querytre.plan) whose numbers have type dtype.
+
+    Plans are cached by expression and dtype, so that repeated evaluations of the
+    same expression only pay the parse cost once. With optimize, the plan is
+    rewritten into an equivalent cheaper one (see querytre.optimizer). Bounds of
+    restrictions may be named, e.g. p[l:u], see querytre.parametric.
+    """
+    if dtype not in DTYPES:
+        raise ValueError("Unknown dtype: Options are {int, float, rational}")
 
-def eval(df, expr, timescale=1, projection=None, dtype="int", **kwargs):
     lexer = QueryLexer(InputStream(expr))
     stream = CommonTokenStream(lexer)
+    stream.fill()
+    parameterize(stream.tokens)
     parser = QueryParser(stream)
     tree = parser.expr()
 
+    query_plan = plan.build(tree, DTYPES[dtype])
+    if optimize:
+        query_plan = optimizer.rewrite(query_plan)
+
+    return query_plan
+
+
+def parameterize(tokens):
+    """Retypes the identifiers in the bounds of restrictions (e.g. l in p[l:]) as numbers.
+
+    The grammar only allows numbers in bounds. The plan builder turns numbers
+    whose text is an identifier into parameters.
+    """
+    tokens = [token for token in tokens if token.channel == Token.DEFAULT_CHANNEL]
+    for previous, token, following in zip(tokens, tokens[1:], tokens[2:]):
+        if token.type == QueryLexer.IDENTIFIER and (previous.text, following.text) in (('[', ':'), (':', ']')):
+            token.type = QueryLexer.NUMBER
+
+
+def eval(df, expr, timescale=1, projection=None, dtype="int", closure="seminaive", max_rounds=0, executor=None,
+         cost_model=False, processes=None, **kwargs):
     kwargs['timescale'] = timescale
 
-    evaluator = QueryEvaluator(df, dtype, **kwargs)
-    zones = evaluator.visit(tree)
+    evaluator = QueryEvaluator(df, dtype, closure=closure, max_rounds=max_rounds, executor=executor, **kwargs)
+    query_plan = compile(expr, dtype)
+    if plan.parameters(query_plan):
+        raise ValueError("Unbound parameters: use querytre.parametric to evaluate " + expr)
+
+    if cost_model:
+        # The periods of the atoms are memoized by the evaluator and reused below
+        sizes = {name: len(evaluator.signal(name)[0]) for name in plan.atoms(query_plan)}
+        query_plan = optimizer.rewrite(query_plan, sizes)
+
+    if processes is not None and processes > 1:
+        zones = evaluate_partitioned(evaluator, query_plan, dtype, processes)
+    else:
+        zones = evaluator.visit(query_plan)
 
     if projection is None:
         result = zones
     elif projection == 'span':
-        result = [(z.bmin().value / timescale, z.emax().value / timescale) for z in zones]
+        values, _ = zones.to_numpy()
+        result = list(zip((values[:, 0] / timescale).tolist(), (values[:, 3] / timescale).tolist()))
+
+    return result
 
+
+def eval_many(dfs, expr, ordered=True, max_workers=None, executor=None, **kwargs):
+    """Evaluates expr over each DataFrame of dfs on a thread pool.
+
+    Yields the results in the order of dfs, or pairs (i, result) as the evaluations
+    complete if not ordered. The other arguments are those of eval. The query is
+    compiled once, and the zone set operations release the GIL, so that the
+    traces are evaluated in parallel. Without executor, a pool of max_workers
+    threads is created for the call.
+    """
+    if isinstance(executor, ProcessPoolExecutor):
+        raise ValueError("Process pools are not supported, use a thread pool")
+
+    # Fails early on syntax errors, and caches the plan for the evaluations below
+    compile(expr, kwargs.get('dtype', "int"))
+
+    pool = ThreadPoolExecutor(max_workers) if executor is None else executor
+    futures = {}
+    try:
+        for i, df in enumerate(dfs):
+            futures[pool.submit(eval, df, expr, **kwargs)] = i
+
+        if ordered:
+            for future in futures:
+                yield future.result()
+        else:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is None:
+            pool.shutdown()
+
+
+def evaluate_partitioned(evaluator, query_plan, dtype, processes):
+    """Evaluates query_plan over slices of the time axis on processes processes.
+
+    Each process computes the matches ending in its slice, from the periods of the
+    atoms that overlap the slice widened by the duration bound of the query (see
+    plan.max_duration). The periods are collected in the current process. Queries
+    without a duration bound, with modal operators or over rationals, whose zones
+    cannot be passed between processes exactly, are evaluated sequentially.
+    """
+    duration = plan.max_duration(query_plan)
+    operators = plan.operators(query_plan)
+
+    if duration is None or 'Diamond' in operators or 'Box' in operators or dtype == "rational":
+        return evaluator.visit(query_plan)
+
+    horizon = duration * evaluator.kwargs['timescale']
+    signals = {name: evaluator.signal(name) for name in plan.atoms(query_plan)}
+    options = dict(closure=evaluator.closure, max_rounds=evaluator.max_rounds, timescale=evaluator.kwargs['timescale'])
+
+    # Slices with the same number of samples, the first and last ones unbounded
+    index = evaluator.df.index.to_numpy().astype(int)
+    cuts = np.unique(index[[len(index) * k // processes for k in range(1, processes)]]).tolist() if len(index) else []
+    slices = list(zip([None] + cuts, cuts + [None]))
+
+    with ProcessPoolExecutor(processes) as pool:
+        futures = []
+        for lower, upper in slices:
+            # Matches ending after lower begin after lower - horizon
+            start = None if lower is None else lower - horizon
+            futures.append(pool.submit(evaluate_slice, query_plan, dtype, overlapping(signals, start, upper),
+                                       lower, upper, options))
+
+        return merge([type(evaluator.zoneset).from_numpy(*future.result()) for future in futures])
+
+
+def evaluate_slice(query_plan, dtype, signals, lower, upper, options):
+    """Returns the arrays (values, signs) of the matches of query_plan ending in (lower, upper]."""
+    evaluator = PeriodsEvaluator(signals, dtype, **options)
+    matches = evaluator.zoneset.intersection(evaluator.visit(query_plan), evaluator.slab(lower, upper))
+    values, signs = matches.to_numpy()
+    return np.array(values), np.array(signs)
+
+
+def overlapping(signals, start, end):
+    """Returns the periods of signals that end at start or later and begin at end or earlier."""
+    result = {}
+    for name, (begins, ends) in signals.items():
+        first = 0 if start is None else np.searchsorted(ends, start)
+        last = len(begins) if end is None else np.searchsorted(begins, end, side='right')
+        result[name] = (begins[first:last], ends[first:last])
     return result
 
 
+def merge(zsets):
+    """Returns the union of a non-empty list of zone sets, merged pairwise."""
+    while len(zsets) > 1:
+        zsets = [type(zsets[0]).union(*zsets[i:i + 2]) for i in range(0, len(zsets), 2)]
+    return zsets[0]
+
+
 def num_false_negatives_bound(df, expr, labels, fn_bound, timescale=1, dtype="int", **kwargs):
     matchset = eval(df, expr, timescale=timescale, dtype=dtype, **kwargs)
-    num_fn = 0
-    for label in labels:
-        singleton_label_list = []
-        singleton_label_list.append(label)
-        label_zone_set = zonesetf.from_periods(singleton_label_list, anchor='both')
-        # Inclusion test
-        if not matchset.includes(label_zone_set):
-            num_fn += 1
-    return num_fn <= fn_bound
+    return num_false_negatives(matchset, labels, fn_bound) <= fn_bound
+
 
+def num_false_negatives_bound_many(episodes, expr, fn_bound, timescale=1, dtype="int", **kwargs):
+    """Yields num_false_negatives_bound for each pair (df, labels) of episodes, see eval_many."""
+    episodes = list(episodes)
+    matchsets = eval_many([df for df, _ in episodes], expr, timescale=timescale, dtype=dtype, **kwargs)
+    for matchset, (_, labels) in zip(matchsets, episodes):
+        yield num_false_negatives(matchset, labels, fn_bound) <= fn_bound
 
-class QueryEvaluator(QueryVisitor):
 
-    def __init__(self, df, dtype="int", **kwargs):
+def num_false_negatives(matchset, labels, limit=None):
+    """Returns the number of labels, periods (begin, end), that matchset does not match.
+
+    The labels are tested in a single sweep, which stops once more than limit
+    labels are found not matched.
+    """
+    labels = np.asarray(labels).reshape(-1, 2)
+    return matchset.num_excluded(labels[:, 0], labels[:, 1], limit)
+
+
+class QueryEvaluator(object):
+    """Evaluates the nodes of a plan over a DataFrame.
+
+    Each distinct node of the plan and the periods of each atom are computed once
+    per evaluator, even if the expression mentions them several times.
+    """
+
+    def __init__(self, df, dtype="int", closure="seminaive", max_rounds=0, executor=None, **kwargs):
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError("Process pools are not supported, use a thread pool")
+
         self.df = df
         self.kwargs = kwargs
+        self.closure = closure
+        self.max_rounds = max_rounds
+        self.executor = executor
         self.zoneset: Union[zoneset, zonesetf, zonesetq]
 
+        self.lock = Lock()
+        self.results = {}
+        self.periods = {}
+
         if dtype == "int":
             self.dtype = int
             self.zoneset = zoneset()
@@ -60,131 +231,156 @@ class QueryEvaluator(QueryVisitor):
             self.dtype = Fraction
             self.zoneset = zonesetq()
 
-    # Visit a parse tree produced by QueryParser#Intersection.
-    def visitIntersection(self, ctx: QueryParser.IntersectionContext):
-        left = self.visit(ctx.left)
-        right = self.visit(ctx.right)
-        return self.zoneset.intersection(left, right)
-
-    # Visit a parse tree produced by QueryParser#True.
-    def visitTrue(self, ctx: QueryParser.TrueContext):
-        return self.zoneset.true()
-
-    # Visit a parse tree produced by QueryParser#Atomic.
-    def visitAtomic(self, ctx: QueryParser.AtomicContext):
-        name = ctx.name.text
-        periods = self.collect(self.df, self.kwargs[name])
-        return self.zoneset.from_periods(periods)
-
-    # Visit a parse tree produced by QueryParser#NegAtomic.
-    def visitRiseAtomic(self, ctx: QueryParser.RiseAtomicContext):
-        name = ctx.name.text
-        periods = self.collect(self.df, self.kwargs[name])
-        return self.zoneset.from_periods(periods, anchor='rise')
-
-    # Visit a parse tree produced by QueryParser#NegAtomic.
-    def visitFallAtomic(self, ctx: QueryParser.FallAtomicContext):
-        name = ctx.name.text
-        periods = self.collect(self.df, self.kwargs[name])
-        return self.zoneset.from_periods(periods, anchor='fall')
-
-    # Visit a parse tree produced by QueryParser#NegAtomic.
-    def visitDualAtomic(self, ctx: QueryParser.DualAtomicContext):
-        name = ctx.name.text
-        periods = self.collect(self.df, self.kwargs[name])
-        return self.zoneset.from_periods(periods, anchor='both')
-
-    # Visit a parse tree produced by QueryParser#Diamond.
-    def visitDiamond(self, ctx: QueryParser.DiamondContext):
-        return self.visit(ctx.child)
-
-    # Visit a parse tree produced by QueryParser#Box.
-    def visitBox(self, ctx: QueryParser.BoxContext):
-        return self.visit(ctx.child)
-
-    # Visit a parse tree produced by QueryParser#Grouping.
-    def visitGrouping(self, ctx: QueryParser.GroupingContext):
-        return self.visit(ctx.child)
-
-    # Visit a parse tree produced by QueryParser#Difference.
-    def visitDifference(self, ctx: QueryParser.DifferenceContext):
-        left = self.visit(ctx.left)
-        right = self.visit(ctx.right)
-        return self.zoneset.difference(left, right)
-
-    # Visit a parse tree produced by QueryParser#Union.
-    def visitUnion(self, ctx: QueryParser.UnionContext):
-        left = self.visit(ctx.left)
-        right = self.visit(ctx.right)
-        return self.zoneset.union(left, right)
+    def visit(self, node):
+        return self.memoized(self.results, node, lambda: getattr(self, 'visit' + node.op)(node))
 
-    # Visit a parse tree produced by QueryParser#Restriction.
-    def visitRestriction(self, ctx: QueryParser.RestrictionContext):
-        child = self.visit(ctx.child)
+    def memoized(self, table, key, function):
+        """Returns table[key], calling function to compute it on the first request.
 
-        lbound = self.dtype(ctx.l.text) * self.kwargs['timescale']
-        ubound = self.dtype(ctx.u.text) * self.kwargs['timescale']
+        Threads requesting a key that another thread is computing wait for its result.
+        """
+        with self.lock:
+            future = table.get(key)
+            owner = future is None
+            if owner:
+                future = table[key] = Future()
 
-        return self.zoneset.duration_restriction(child, lbound, ubound)
+        if owner:
+            try:
+                future.set_result(function())
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+
+        return future.result()
 
-    # Visit a parse tree produced by QueryParser#Concatenation.
-    def visitConcatenation(self, ctx: QueryParser.ConcatenationContext):
-        left = self.visit(ctx.left)
-        right = self.visit(ctx.right)
-        return self.zoneset.concatenation(left, right)
+    def visitIntersection(self, node):
+        return self.zoneset.intersection(*self.visit_all(plan.chain(node)))
 
-    # Visit a parse tree produced by QueryParser#Star.
-    def visitStar(self, ctx: QueryParser.StarContext):
-        return self.zoneset.transitive_closure(self.visit(ctx.child))
+    def visitTrue(self, node):
+        return self.zoneset.complementation(type(self.zoneset)())
 
-    # Visit a parse tree produced by QueryParser#Complementation.
-    def visitComplementation(self, ctx: QueryParser.ComplementationContext):
-        child = self.visit(ctx.left)
-        return self.zoneset.complementation(child)
+    def visitAtomic(self, node):
+        begins, ends = self.signal(node.args[0])
+        return self.zoneset.from_arrays(begins, ends)
 
-    # Visit a parse tree produced by QueryParser#Question.
-    def visitQuestion(self, ctx: QueryParser.QuestionContext):
-        return self.visit(ctx.child)
+    def visitRiseAtomic(self, node):
+        begins, ends = self.signal(node.args[0])
+        return self.zoneset.from_arrays(begins, ends, anchor='rise')
 
-    # Visit a parse tree produced by QueryParser#Plus.
-    def visitPlus(self, ctx: QueryParser.PlusContext):
-        return self.zoneset.transitive_closure(self.visit(ctx.child))
+    def visitFallAtomic(self, node):
+        begins, ends = self.signal(node.args[0])
+        return self.zoneset.from_arrays(begins, ends, anchor='fall')
 
-    # Visit a parse tree produced by QueryParser#Plus.
-    def visitDiamond(self, ctx: QueryParser.DiamondContext):
-        relation = ctx.relation.text
-        lbound = self.dtype(ctx.l.text) * self.kwargs['timescale']
-        ubound = self.dtype(ctx.u.text) * self.kwargs['timescale']
+    def visitDualAtomic(self, node):
+        begins, ends = self.signal(node.args[0])
+        return self.zoneset.from_arrays(begins, ends, anchor='both')
 
-        return self.zoneset.modal_diamond(ctx.child, relation, lbound, ubound)
+    def visitDifference(self, node):
+        left, right = self.visit_pair(*node.children)
+        return self.zoneset.set_difference(left, right)
+
+    def visitUnion(self, node):
+        left, right = self.visit_pair(*node.children)
+        return self.zoneset.union(left, right)
 
-    def visitBox(self, ctx: QueryParser.BoxContext):
-        relation = ctx.relation.text
-        lbound = self.dtype(ctx.l.text) * self.kwargs['timescale']
-        ubound = self.dtype(ctx.u.text) * self.kwargs['timescale']
+    def visitRestriction(self, node):
+        child = self.visit(node.children[0])
+        lbound, ubound = self.bounds(*node.args)
+        return self.zoneset.duration_restriction(child, lbound, ubound)
 
-        return self.zoneset.modal_box(ctx.child, relation, lbound, ubound)
+    def visitConcatenation(self, node):
+        return self.zoneset.concatenation(*self.visit_all(plan.chain(node)), dmax=self.hint(node))
+
+    def visitStar(self, node):
+        return self.zoneset.transitive_closure(self.visit(node.children[0]), self.closure, self.max_rounds,
+                                               self.hint(node))
+
+    def visitPlus(self, node):
+        return self.zoneset.transitive_closure(self.visit(node.children[0]), self.closure, self.max_rounds,
+                                               self.hint(node))
+
+    def visitQuestion(self, node):
+        return self.visit(node.children[0])
+
+    def visitComplementation(self, node):
+        return self.zoneset.complementation(self.visit(node.children[0]))
+
+    def visitDiamond(self, node):
+        relation, lower, upper = node.args
+        lbound, ubound = self.bounds(lower, upper)
+        return self.zoneset.modal_diamond(self.visit(node.children[0]), relation, lbound, ubound)
+
+    def visitBox(self, node):
+        relation, lower, upper = node.args
+        lbound, ubound = self.bounds(lower, upper)
+        return self.zoneset.modal_box(self.visit(node.children[0]), relation, lbound, ubound)
+
+    def hint(self, node):
+        """Returns the scaled duration bound of the zones of node that are needed, None if unbounded."""
+        return self.bounds(None, node.args[0])[1] if node.args else None
+
+    def bounds(self, lower, upper):
+        """Scales the duration bounds of a node, missing bounds being 0 and infinity."""
+        timescale = self.kwargs['timescale']
+        lbound = 0 if lower is None else lower * timescale
+        ubound = self.zoneset.infinity if upper is None else upper * timescale
+        if self.dtype is Fraction:
+            # Rational bounds are passed as strings of form "1/2"
+            return str(lbound), str(ubound)
+        return lbound, ubound
+
+    def visit_pair(self, left, right):
+        """Visits two independent subtrees."""
+        return tuple(self.visit_all([left, right]))
+
+    def visit_all(self, nodes):
+        """Visits independent subtrees.
+
+        With an executor, all the subtrees but the last are evaluated on the executor
+        while the current thread evaluates the last one. The tasks that have not
+        started by then (e.g. all the workers wait for their own subtrees) are
+        cancelled and evaluated in the current thread instead, so nested calls
+        cannot deadlock.
+        """
+        if self.executor is None:
+            return [self.visit(node) for node in nodes]
+
+        futures = [self.executor.submit(self.visit, node) for node in nodes[:-1]]
+        last = self.visit(nodes[-1])
+
+        results = [self.visit(node) if future.cancel() else future.result() for node, future in zip(nodes, futures)]
+        return results + [last]
+
+    def slab(self, lower, upper):
+        """Returns the zone set of the zones ending in (lower, upper], missing bounds being unbounded."""
+        infinity = self.dtype(self.zoneset.infinity)
+        lower = -infinity if lower is None else lower
+        upper = infinity if upper is None else upper
+        values = [self.dtype(value) for value in (-infinity, upper, lower, upper, -infinity, infinity)]
+
+        if self.dtype is Fraction:
+            values = [str(value) for value in values]
+
+        zset = type(self.zoneset)()
+        zset.add(*values)
+        return zset
+
+    def signal(self, name):
+        """Returns the periods (begins, ends) where the atom name holds."""
+        return self.memoized(self.periods, name, lambda: self.collect(self.df, self.kwargs[name]))
 
     def collect(self, df, predicate):
+        begins, ends = periods.collect(df, predicate)
+        return begins.astype(int), ends.astype(int)
+
+
+class PeriodsEvaluator(QueryEvaluator):
+    """Evaluates the nodes of a plan over given periods, a dict from atom names to (begins, ends)."""
+
+    def __init__(self, signals, dtype="int", **kwargs):
+        super(PeriodsEvaluator, self).__init__(None, dtype, **kwargs)
+        self.signals = signals
 
-        def _collect(df, predicate):
-            value = False
-            prev = None
-            for row in df.itertuples():
-                prev = row
-                if predicate(row) != value:
-                    value = not value
-                    yield (int(row.Index))
-
-            if value:
-                yield (int(prev.Index))
-
-        value = False
-        begin = end = None
-        for ts in _collect(df, predicate):
-            if value:
-                end = ts
-                yield (begin, end)
-            else:
-                begin = ts
-            value = not value
+    def signal(self, name):
+        return self.signals[name]
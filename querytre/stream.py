@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+from querytre import chunks as readers, periods, plan, optimizer
+from querytre.query import DTYPES, PeriodsEvaluator, compile, merge
+
+
+def eval_stream(chunks, expr, timescale=1, dtype="int", window=None, **kwargs):
+    """Evaluates expr over an iterable of DataFrame chunks.
+
+    Yields the zone set of the matches finalized by each chunk, then the matches
+    left at the end of the stream. Together, they match the same periods as
+    query.eval over the concatenation of the chunks.
+    """
+    evaluator = StreamEvaluator(expr, timescale=timescale, dtype=dtype, window=window, **kwargs)
+    for chunk in chunks:
+        yield evaluator.push(chunk)
+    yield evaluator.close()
+
+
+def fall_atoms(query_plan):
+    """Returns the set of the names of the atoms of query_plan anchored at a fall."""
+    if query_plan.op in ('FallAtomic', 'DualAtomic'):
+        return {query_plan.args[0]}
+    return set().union(*(fall_atoms(child) for child in query_plan.children))
+
+
+def eval_chunks(chunks, expr, timescale=1, dtype="int", window=None, **kwargs):
+    """Evaluates expr over an iterable of DataFrame chunks, returns the zone set of the matches.
+
+    The result is that of query.eval over the concatenation of the chunks, while
+    only one chunk and the periods within the duration bounds of expr (see
+    StreamEvaluator) are kept in memory.
+    """
+    results = list(eval_stream(chunks, expr, timescale=timescale, dtype=dtype, window=window, **kwargs))
+
+    return merge(results)
+
+
+def eval_file(path, expr, chunksize=100000, index_col=None, columns=None, timescale=1, dtype="int", window=None,
+              **kwargs):
+    """Evaluates expr over a CSV, Parquet or NPY file read in chunks of chunksize rows.
+
+    See querytre.chunks.read for the file formats, and eval_chunks for the result.
+    """
+    chunks = readers.read(path, chunksize, index_col, columns)
+    return eval_chunks(chunks, expr, timescale=timescale, dtype=dtype, window=window, **kwargs)
+
+
+class Signal(object):
+    """Periods (begins, ends) of an atom over a stream, stitched across chunks."""
+
+    def __init__(self):
+        self.begins = np.empty(0, dtype=int)
+        self.ends = np.empty(0, dtype=int)
+        # Whether the atom holds at the last sample, i.e. the last period may continue
+        self.open = False
+
+    def append(self, index, values):
+        begins, ends = periods.from_mask(index, values)
+
+        if self.open:
+            # The last period continues into the chunk, or ends at its first sample
+            if values[0]:
+                self.ends[-1] = ends[0]
+                begins, ends = begins[1:], ends[1:]
+            else:
+                self.ends[-1] = index[0]
+
+        self.begins = np.concatenate((self.begins, begins))
+        self.ends = np.concatenate((self.ends, ends))
+        self.open = bool(values[-1])
+
+    def drop(self, start):
+        """Forgets the periods ending before start."""
+        first = np.searchsorted(self.ends, start)
+        self.begins = self.begins[first:]
+        self.ends = self.ends[first:]
+
+
+class StreamEvaluator(object):
+    """Evaluates a query incrementally over a stream of DataFrame chunks.
+
+    The periods of the atoms are stitched across chunks. A match (b, e) only
+    depends on the samples up to e, so that the matches ending by the last sample
+    (the watermark) are final and emitted once. If the durations of the
+    matches are bounded, by the restrictions of the query or by window, the periods
+    that can no longer take part in a match are forgotten and memory is bounded by
+    the window. Otherwise all the periods are kept.
+
+    Each chunk evaluates the query over the buffered periods, and the matches
+    ending between the previous and the current watermark are returned. Modal
+    operators look beyond the ends of matches and are not supported.
+    """
+
+    def __init__(self, expr, timescale=1, dtype="int", window=None, closure="seminaive", max_rounds=0, **kwargs):
+        query_plan = compile(expr, dtype)
+        if plan.parameters(query_plan):
+            raise ValueError("Parameters are not supported on streams")
+
+        if window is not None:
+            # Matches longer than window are not reported
+            query_plan = optimizer.rewrite(optimizer.restriction(query_plan, None, DTYPES[dtype](window)))
+
+        operators = plan.operators(query_plan)
+        if 'Diamond' in operators or 'Box' in operators:
+            raise ValueError("Modal operators are not supported on streams")
+
+        duration = plan.max_duration(query_plan)
+
+        self.plan = query_plan
+        self.dtype = dtype
+        self.closure = closure
+        self.max_rounds = max_rounds
+        self.kwargs = dict(kwargs, timescale=timescale)
+        self.horizon = None if duration is None else duration * timescale
+        # Matches anchored at a fall end at the first sample where the atom no longer
+        # holds, so they are not final while the atom holds at the last sample
+        self.anchored = fall_atoms(query_plan)
+        self.signals = {name: Signal() for name in plan.atoms(query_plan)}
+        self.evaluator = self.window()
+
+        # Last sample, and end of the last emitted matches (None before the first)
+        self.last = None
+        self.watermark = None
+        self.closed = False
+
+    def push(self, df):
+        """Adds the next chunk of the stream, returns the matches it finalizes."""
+        if self.closed:
+            raise ValueError("Stream is closed")
+        if len(df) == 0:
+            return self.empty()
+
+        index = df.index.to_numpy().astype(int)
+        if self.last is not None and index[0] <= self.last:
+            raise ValueError("Chunks must follow each other in time")
+
+        for name, signal in self.signals.items():
+            signal.append(index, periods.mask(df, self.kwargs[name]))
+
+        if any(self.signals[name].open for name in self.anchored):
+            final = index[-2] if len(index) > 1 else self.last
+        else:
+            final = index[-1]
+        self.last = index[-1]
+
+        return self.emit(final)
+
+    def push_event(self, timestamp, values):
+        """Adds a single sample, values being a dict from column names to values."""
+        return self.push(pd.DataFrame([values], index=[timestamp]))
+
+    def close(self):
+        """Ends the stream, returns the matches left.
+
+        As in query.eval, the periods still open end at the last sample, and the
+        matches of e.g. complementations extend past it.
+        """
+        self.closed = True
+        if self.last is None:
+            return self.empty()
+        return self.emit(self.infinity())
+
+    def emit(self, final):
+        if final is None or (self.watermark is not None and final <= self.watermark):
+            return self.empty()
+
+        matches = self.window().visit(self.plan)
+        result = self.evaluator.zoneset.intersection(matches, self.evaluator.slab(self.watermark, final))
+        self.watermark = final
+
+        if self.horizon is not None:
+            # Later matches end after final, so they begin after final - horizon
+            for signal in self.signals.values():
+                signal.drop(final - self.horizon)
+
+        return result
+
+    def window(self):
+        signals = {name: (signal.begins, signal.ends) for name, signal in self.signals.items()}
+        return PeriodsEvaluator(signals, self.dtype, closure=self.closure, max_rounds=self.max_rounds, **self.kwargs)
+
+    def empty(self):
+        return type(self.evaluator.zoneset)()
+
+    def infinity(self):
+        return DTYPES[self.dtype](self.evaluator.zoneset.infinity)
@@ -9,8 +9,13 @@ import io
 
 from PIL import Image
 
+from querytre import periods, ordering
+
 class zoneset(object):
     """docstring for zoneset"""
+
+    infinity = ext.infinity
+
     def __init__(self, data=None):
         super(zoneset, self).__init__()
         if data == None:
@@ -57,12 +62,31 @@ class zoneset(object):
     def concatenate(self, other):
         return zoneset.concatenation(self, other)
 
-    def iterate(self):
-        return zoneset.transitive_closure(self)
+    def iterate(self, method="seminaive", max_rounds=0):
+        return zoneset.transitive_closure(self, method, max_rounds)
+
+    # Flags of the periods (begins[i], ends[i]) that lie in the zone set, tested in a
+    # single sweep
+    def contains_points(self, begins, ends):
+        return self.container.contains_points(begins, ends)
+
+    # Number of the periods not matched by the zone set. Counting stops once it
+    # exceeds limit.
+    def num_excluded(self, begins, ends, limit=None):
+        _, excluded = self.container.includes_each(begins, ends, -1 if limit is None else limit)
+        return excluded
 
     def empty(self):
         return self.container.empty()
 
+    def __len__(self):
+        return len(self.container)
+
+    # Read-only (n, 6) arrays of bound values and signs, in the order
+    # bmin, bmax, emin, emax, dmin, dmax. They share memory with the zone set.
+    def to_numpy(self):
+        return self.container.to_numpy()
+
     @classmethod
     def from_periods(cls, periods, anchor=None):
 
@@ -87,31 +111,35 @@ class zoneset(object):
         return zset
 
     @classmethod
-    def from_dataframe(cls, df, predicate, anchor=None):
-        def collect(df, predicate):
-            def _collect(df, predicate):
-                value = False
-                for row in df.itertuples():
-                    if predicate(row) != value:
-                        value = not value
-                        yield(row.Index)
+    def from_arrays(cls, begins, ends, anchor=None):
 
-                if value:
-                    yield(df.iloc[-1].Index)
+        zset = zoneset()
 
-            value = False
-            begin = end = None
-            for ts in _collect(df, predicate):
-                if value:
-                    end = ts
-                    yield (begin, end)          
-                else:
-                    begin = ts 
-                value = not value
+        if anchor == None:
+            kind = ""
+        elif anchor == "rise" or anchor == "fall" or anchor == "both":
+            kind = anchor
+        elif anchor == "none":
+            kind = "both"
+        else:
+            raise Exception(r"Unknown anchor: Options are {none, rise, fall, both}")
 
-        return cls.from_periods(collect(df, predicate), anchor)
+        # A single call across the language boundary for all the periods
+        zset.container.add_periods(begins, ends, kind)
 
+        return zset
 
+    # Inverse of to_numpy, e.g. for zone sets computed in another process
+    @classmethod
+    def from_numpy(cls, values, signs):
+        zset = zoneset()
+        zset.container.add_zones(values, signs)
+        return zset
+
+    @classmethod
+    def from_dataframe(cls, df, predicate, anchor=None):
+        begins, ends = periods.collect(df, predicate)
+        return cls.from_arrays(begins, ends, anchor)
 
     @classmethod
     def union(cls, first, *others):
@@ -121,11 +149,15 @@ class zoneset(object):
 
         return zoneset(result)
 
+    # Operands are intersected from the smallest to the largest
     @classmethod
     def intersection(cls, first, *others):
-        result = first.container
-        for other in others:
-            result = ext.intersection(result, other.container)
+        operands = (first,) + others
+        order = ordering.intersection_order([len(operand) for operand in operands])
+
+        result = operands[order[0]].container
+        for i in order[1:]:
+            result = ext.intersection(result, operands[i].container)
 
         return zoneset(result)
 
@@ -139,19 +171,38 @@ class zoneset(object):
 
     @classmethod
     def set_difference(cls, first, second):
-        return zoneset(ext.set_difference(first.container, second.container))
+        return zoneset(ext.difference(first.container, second.container))
 
+    # Chains of operands are bracketed by their sizes. Given dmax, only the zones
+    # whose durations are at most dmax are computed, e.g. for a restriction.
     @classmethod
-    def concatenation(cls, first, *others):
-        result = first.container
-        for other in others:
-            result = ext.concatenation(result, other.container)
-
-        return zoneset(result)
-
+    def concatenation(cls, first, *others, dmax=None):
+        operands = (first,) + others
+
+        def evaluate(bracketing):
+            if isinstance(bracketing, int):
+                return operands[bracketing].container
+            left, right = bracketing
+            if dmax is None:
+                return ext.concatenation(evaluate(left), evaluate(right))
+            return ext.concatenation(evaluate(left), evaluate(right), dmax)
+
+        return zoneset(evaluate(ordering.concatenation_order([len(operand) for operand in operands])))
+
+    # Kleene plus of zset. The "seminaive" method extends the zones found in the
+    # previous round only, "doubling" squares the result in each round. A
+    # RuntimeError is raised if no fixpoint is reached within max_rounds rounds
+    # (0 for no bound). Given dmax, only the zones whose durations are at most dmax
+    # are computed, so that the rounds stop once all the new zones are longer.
     @classmethod
-    def transitive_closure(cls, zset):
-        return zoneset(ext.transitive_closure(zset.container))
+    def transitive_closure(cls, zset, method="seminaive", max_rounds=0, dmax=None):
+        dmax = cls.infinity if dmax is None else dmax
+        if method == "seminaive":
+            return zoneset(ext.transitive_closure(zset.container, max_rounds, dmax))
+        elif method == "doubling":
+            return zoneset(ext.transitive_closure_doubling(zset.container, max_rounds, dmax))
+        else:
+            raise ValueError("Unknown closure method")
 
     @classmethod
     def modal_diamond(cls, zset, relation, lower, upper):
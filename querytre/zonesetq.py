@@ -7,12 +7,25 @@ from matplotlib.figure import Figure
 
 import io
 
+from fractions import Fraction
+
+import numpy as np
+
 from PIL import Image
 
+from querytre import periods, ordering
+
+# Rationals are passed to the extension as strings of form "1/2"
+def strings(values):
+    return [str(Fraction(value)) for value in values]
+
 # [TODO] Decide if we want to use overloading of getitem for duration restriction and modal operations
 
 class zoneset(object):
     """docstring for zoneset"""
+
+    infinity = ext.infinity
+
     def __init__(self, data=None):
         super(zoneset, self).__init__()
         if data == None:
@@ -45,8 +58,9 @@ class zoneset(object):
         return zoneset.includes(self, other) and zoneset.includes(other, self)
 
     # [TODO] We cannot directly pass rationals from Python to C++
+    # Bounds are strings of form "1/2", as rationals cannot be passed directly
     def add(self, bmin, bmax, emin, emax, dmin, dmax):
-        self.container.add(ext.zone.make(ext.geq(bmin), ext.lt(bmax),ext.gt(emin), ext.leq(emax), ext.gt(dmin), ext.leq(dmax)))
+        self.container.add_string([bmin, bmax, emin, emax, dmin, dmax], [True, False, False, True, False, True])
 
     def union(self, other):
         return zoneset.union(self, other)
@@ -63,12 +77,31 @@ class zoneset(object):
     def includes(self, other):
         return ext.includes(self.container, other.container)
 
-    def iterate(self):
-        return zoneset.transitive_closure(self)
+    def iterate(self, method="seminaive", max_rounds=0):
+        return zoneset.transitive_closure(self, method, max_rounds)
+
+    # Flags of the periods (begins[i], ends[i]) that lie in the zone set, tested in a
+    # single sweep
+    def contains_points(self, begins, ends):
+        contained, _ = self.container.includes_each(strings(begins), strings(ends))
+        return np.array(contained, dtype=bool)
+
+    # Number of the periods not matched by the zone set. Counting stops once it
+    # exceeds limit.
+    def num_excluded(self, begins, ends, limit=None):
+        _, excluded = self.container.includes_each(strings(begins), strings(ends), -1 if limit is None else limit)
+        return excluded
 
     def empty(self):
         return self.container.empty()
 
+    def __len__(self):
+        return len(self.container)
+
+    # Rationals are exported through their floating point approximation
+    def to_numpy(self):
+        return self.get_as_float().to_numpy()
+
     # Python default float is C++ double
     def get_as_float(self):
         from .zonesetf import zoneset as zonesetf
@@ -97,32 +130,16 @@ class zoneset(object):
 
         return zset
 
+    # Rationals have no array buffer, so periods are passed one by one as strings
     @classmethod
-    def from_dataframe(cls, df, predicate, anchor=None):
-        def collect(df, predicate):
-            def _collect(df, predicate):
-                value = False
-                for row in df.itertuples():
-                    if predicate(row) != value:
-                        value = not value
-                        yield(row.Index)
-
-                if value:
-                    yield(df.iloc[-1].Index)
-
-            value = False
-            begin = end = None
-            for ts in _collect(df, predicate):
-                if value:
-                    end = ts
-                    yield (begin, end)
-                else:
-                    begin = ts
-                value = not value
-
-        return cls.from_periods(collect(df, predicate), anchor)
-
+    def from_arrays(cls, begins, ends, anchor=None):
+        pairs = ((str(Fraction(begin)), str(Fraction(end))) for (begin, end) in zip(begins, ends))
+        return cls.from_periods(pairs, anchor)
 
+    @classmethod
+    def from_dataframe(cls, df, predicate, anchor=None):
+        begins, ends = periods.collect(df, predicate)
+        return cls.from_arrays(begins, ends, anchor)
 
     @classmethod
     def union(cls, first, *others):
@@ -132,11 +149,15 @@ class zoneset(object):
 
         return zoneset(result)
 
+    # Operands are intersected from the smallest to the largest
     @classmethod
     def intersection(cls, first, *others):
-        result = first.container
-        for other in others:
-            result = ext.intersection(result, other.container)
+        operands = (first,) + others
+        order = ordering.intersection_order([len(operand) for operand in operands])
+
+        result = operands[order[0]].container
+        for i in order[1:]:
+            result = ext.intersection(result, operands[i].container)
 
         return zoneset(result)
 
@@ -152,19 +173,38 @@ class zoneset(object):
 
     @classmethod
     def set_difference(cls, first, second):
-        return zoneset(ext.set_difference(first.container, second.container))
+        return zoneset(ext.difference(first.container, second.container))
 
+    # Chains of operands are bracketed by their sizes. Given dmax, only the zones
+    # whose durations are at most dmax are computed, e.g. for a restriction.
     @classmethod
-    def concatenation(cls, first, *others):
-        result = first.container
-        for other in others:
-            result = ext.concatenation(result, other.container)
-
-        return zoneset(result)
-
+    def concatenation(cls, first, *others, dmax=None):
+        operands = (first,) + others
+
+        def evaluate(bracketing):
+            if isinstance(bracketing, int):
+                return operands[bracketing].container
+            left, right = bracketing
+            if dmax is None:
+                return ext.concatenation(evaluate(left), evaluate(right))
+            return ext.concatenation(evaluate(left), evaluate(right), dmax)
+
+        return zoneset(evaluate(ordering.concatenation_order([len(operand) for operand in operands])))
+
+    # Kleene plus of zset. The "seminaive" method extends the zones found in the
+    # previous round only, "doubling" squares the result in each round. A
+    # RuntimeError is raised if no fixpoint is reached within max_rounds rounds
+    # (0 for no bound). Given dmax, only the zones whose durations are at most dmax
+    # are computed, so that the rounds stop once all the new zones are longer.
     @classmethod
-    def transitive_closure(cls, zset):
-        return zoneset(ext.transitive_closure(zset.container))
+    def transitive_closure(cls, zset, method="seminaive", max_rounds=0, dmax=None):
+        dmax = cls.infinity if dmax is None else dmax
+        if method == "seminaive":
+            return zoneset(ext.transitive_closure(zset.container, max_rounds, dmax))
+        elif method == "doubling":
+            return zoneset(ext.transitive_closure_doubling(zset.container, max_rounds, dmax))
+        else:
+            raise ValueError("Unknown closure method")
 
     # We cannot directly pass lower and upper bounds as rationals
     # Pass them as strings of form "1/2" or "1/10"
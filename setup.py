@@ -43,7 +43,8 @@ setup(
     license='GPLv3+',
     python_requires='>=3',
     install_requires=['antlr4-python3-runtime==4.7.1',
-                      'pybind11>=2.11'],
+                      'pybind11>=2.11',
+                      'numpy'],
     ext_package='timedrel',
     ext_modules=[ext_instance_int, ext_instance_float, ext_instance_rational]
 )